@@ -11,6 +11,16 @@ HERE=$(dirname "$0")
 # Migrate DB
 python manage.py migrate
 
-# Start the server using gunicorn
 export PATH="$HOME/.local/bin:$PATH"
+
+# Start the background jobs worker, and restart it whenever it exits
+(
+    while true; do
+        python manage.py run_jobs >> "$HOME/jobs.log" 2>&1
+        echo "Jobs worker exited with status $?; restarting" >> "$HOME/jobs.log"
+        sleep 5
+    done
+) &
+
+# Start the server using gunicorn
 gunicorn -w 2 hub.wsgi
@@ -1,7 +1,7 @@
-import { For, createSignal, Switch, Match } from "solid-js";
+import { For, createSignal, Show, Switch, Match } from "solid-js";
 import { Spinner } from "../icons";
 import { onMount } from "solid-js";
-import { fetchUrl, playerMatches } from "../utils";
+import { fetchUrl } from "../utils";
 import { useStore } from "../store";
 import { Icon } from "solid-heroicons";
 import {
@@ -10,30 +10,59 @@ import {
   magnifyingGlass
 } from "solid-heroicons/solid-mini";
 
+const PAGE_SIZE = 100;
+
 const RegisteredPlayerList = () => {
   const [store] = useStore();
   const [players, setPlayers] = createSignal([]);
+  const [total, setTotal] = createSignal(0);
+  const [nextCursor, setNextCursor] = createSignal(null);
   const [loading, setLoading] = createSignal(false);
+  const [loadingMore, setLoadingMore] = createSignal(false);
   const [searchText, setSearchText] = createSignal("");
 
-  const playersSuccessHandler = async response => {
-    const data = await response.json();
-    setLoading(false);
-    if (response.ok) {
-      setPlayers(data);
-    } else {
-      console.log(data);
+  const fetchPage = after => {
+    const params = new URLSearchParams({ full_schema: 1, limit: PAGE_SIZE });
+    if (after) {
+      params.set("after", after);
+    }
+    if (searchText()) {
+      params.set("q", searchText());
     }
+    const playersSuccessHandler = async response => {
+      const data = await response.json();
+      setLoading(false);
+      setLoadingMore(false);
+      if (response.ok) {
+        setPlayers(after ? [...players(), ...data] : data);
+        setTotal(Number(response.headers.get("X-Total-Count")));
+        setNextCursor(response.headers.get("X-Next-Cursor"));
+      } else {
+        console.log(data);
+      }
+    };
+    fetchUrl(`/api/players?${params}`, playersSuccessHandler, error => {
+      console.log(error);
+      setLoading(false);
+      setLoadingMore(false);
+    });
+  };
+
+  const search = text => {
+    setSearchText(text);
+    setLoading(true);
+    fetchPage(null);
+  };
+
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchPage(nextCursor());
   };
 
   onMount(() => {
     console.log("Fetching players info...");
     setLoading(true);
-    // FIXME: Paginate
-    fetchUrl("/api/players?full_schema=1", playersSuccessHandler, error => {
-      console.log(error);
-      setLoading(false);
-    });
+    fetchPage(null);
   });
 
   return (
@@ -42,8 +71,7 @@ const RegisteredPlayerList = () => {
         class="text-4xl font-bold text-blue-500"
         id="accordion-collapse-heading-1"
       >
-        Registered Players{" "}
-        {players()?.length > 0 ? `(${players().length})` : ""}
+        Registered Players {total() > 0 ? `(${total()})` : ""}
       </h2>
       <div class="my-4 p-5 border border-gray-200 dark:border-gray-700 dark:bg-gray-900">
         <div class="relative overflow-x-auto">
@@ -68,7 +96,8 @@ const RegisteredPlayerList = () => {
                     id="input-group-search"
                     class="block w-full p-2 pl-10 text-sm text-gray-900 border border-gray-300 rounded-lg bg-gray-50 focus:ring-blue-500 focus:border-blue-500 dark:bg-gray-600 dark:border-gray-500 dark:placeholder-gray-400 dark:text-white dark:focus:ring-blue-500 dark:focus:border-blue-500"
                     placeholder="Search player"
-                    onChange={e => setSearchText(e.target.value)}
+                    value={searchText()}
+                    onChange={e => search(e.target.value)}
                   />
                 </div>
               </div>
@@ -100,13 +129,7 @@ const RegisteredPlayerList = () => {
                   </tr>
                 </thead>
                 <tbody>
-                  <For
-                    each={
-                      searchText()
-                        ? players().filter(p => playerMatches(p, searchText()))
-                        : players()
-                    }
-                  >
+                  <For each={players()}>
                     {player => (
                       <tr class="bg-white border-b dark:bg-gray-800 dark:border-gray-700">
                         <th
@@ -176,6 +199,20 @@ const RegisteredPlayerList = () => {
                   </For>
                 </tbody>
               </table>
+              <Show when={nextCursor()}>
+                <div class="p-3 text-center">
+                  <button
+                    type="button"
+                    class="text-white bg-blue-700 hover:bg-blue-800 focus:ring-4 focus:outline-none focus:ring-blue-300 font-medium rounded-lg text-sm w-full sm:w-auto px-5 py-2.5 text-center dark:bg-blue-600 dark:hover:bg-blue-700 dark:focus:ring-blue-800"
+                    disabled={loadingMore()}
+                    onClick={loadMore}
+                  >
+                    {loadingMore()
+                      ? "Loading..."
+                      : `Load more (${players().length} of ${total()})`}
+                  </button>
+                </div>
+              </Show>
             </Match>
           </Switch>
         </div>
@@ -37,6 +37,24 @@ const ValidateTransactions = () => {
     revalidateOn: "touched"
   });
 
+  const pollJob = async jobId => {
+    const response = await fetch(`/api/jobs/${jobId}`);
+    const job = await response.json();
+    if (!response.ok) {
+      setStatus(job?.message || JSON.stringify(job));
+    } else if (job.status === "succeeded") {
+      setTs(new Date());
+      setStatus(<TransactionStats data={job.result} />);
+    } else if (job.status === "failed") {
+      setStatus("Failed to validate the bank statement!");
+    } else {
+      setStatus(
+        `Validating bank statement... (${job.progress} transactions processed)`
+      );
+      setTimeout(() => pollJob(jobId), 1000);
+    }
+  };
+
   const handleSubmit = async values => {
     const { bank_statement } = values;
 
@@ -51,10 +69,9 @@ const ValidateTransactions = () => {
         },
         body: formData
       });
-      setTs(new Date());
       if (response.ok) {
-        const data = await response.json();
-        setStatus(<TransactionStats data={data} />);
+        const job = await response.json();
+        await pollJob(job.id);
       } else {
         const message = await response.json();
         const text = message?.message || JSON.stringify(message);
@@ -25,7 +25,7 @@ export const fetchTransactions = async () => {
 };
 
 export const fetchAllTransactions = async () => {
-  const response = await fetch("/api/transactions?include_all=1", {
+  const response = await fetch("/api/transactions?include_all=1&stream=1", {
     method: "GET",
     headers: { "Content-Type": "application/json" },
     credentials: "same-origin"
@@ -35,7 +35,7 @@ export const fetchAllTransactions = async () => {
 
 export const fetchAllInvalidTransactions = async () => {
   const response = await fetch(
-    "/api/transactions?include_all=1&only_invalid=1",
+    "/api/transactions?include_all=1&only_invalid=1&stream=1",
     {
       method: "GET",
       headers: { "Content-Type": "application/json" },
@@ -156,6 +156,16 @@ STORAGES = {
 APP_NAME = "UPAI Hub"
 LOGO_URL = "https://hub.indiaultimate.org/static/assets/favico.png"
 
+# Firebase authentication middleware settings
+# Only requests to paths with these prefixes are authenticated using Firebase
+FIREBASE_AUTH_PATHS = ["/api/"]
+# Don't re-verify the Firebase token of a logged in user more often than this
+FIREBASE_TOKEN_REVERIFY_SECONDS = 5 * 60
+
+# Cached registrations of an event are invalidated when new registrations are
+# imported from UC; the timeout limits how stale the players' data can get.
+REGISTRATIONS_CACHE_TIMEOUT = 60 * 60
+
 # Razorpay settings
 RAZORPAY_KEY_ID = os.environ.get("RAZORPAY_KEY_ID", "")
 RAZORPAY_KEY_SECRET = os.environ.get("RAZORPAY_KEY_SECRET", "")
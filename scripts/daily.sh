@@ -1,3 +1,4 @@
 #!/bin/bash
 
 python manage.py invalidate_memberships
+python manage.py sync_razorpay_transactions --days 7
@@ -2,4 +2,4 @@
 
 python manage.py import_uc_events -n 20
 python manage.py sync_razorpay_transactions
-python manage.py import_uc_registrations --since 2023-06-01
+python manage.py import_uc_registrations --since 2023-06-01 --workers 4 --incremental
@@ -1,37 +1,56 @@
 import datetime
-import io
+import hashlib
 import json
 import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
 from typing import Any, cast
 
 import firebase_admin
 from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.base_user import AbstractBaseUser
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db.models import Q, QuerySet
-from django.http import HttpRequest
+from django.db import transaction as db_transaction
+from django.db.models import F, Q, QuerySet
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
 from django.utils.text import slugify
 from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
 from firebase_admin import auth
-from ninja import File, NinjaAPI, UploadedFile
+from ninja import File, Form, NinjaAPI, Schema, UploadedFile
+from ninja.responses import NinjaJSONEncoder
 from ninja.security import django_auth
 
-from server.constants import EVENT_MEMBERSHIP_AMOUNT, MEMBERSHIP_END, MEMBERSHIP_START
+from server.constants import (
+    EVENT_MEMBERSHIP_AMOUNT,
+    MAJOR_AGE,
+    MEMBERSHIP_END,
+    MEMBERSHIP_START,
+    PLAYERS_PAGE_SIZE_MAX,
+    STREAMING_CHUNK_SIZE,
+)
 from server.firebase_middleware import firebase_to_django_user
-from server.manual_transactions import validate_manual_transactions
+from server.jobs import enqueue_job
 from server.models import (
+    DataVersion,
     Event,
     Guardianship,
+    Job,
     ManualTransaction,
     Membership,
     Player,
     RazorpayTransaction,
+    RazorpayWebhookEvent,
     Team,
     UCRegistration,
+    UCSyncState,
     User,
     Vaccination,
+    bump_data_versions,
+    create_membership_number,
 )
 from server.schema import (
     AnnualMembershipSchema,
@@ -42,6 +61,8 @@ from server.schema import (
     FirebaseSignUpCredentials,
     GroupMembershipSchema,
     GuardianshipFormSchema,
+    ImportMembersJobFormSchema,
+    JobSchema,
     ManualTransactionSchema,
     ManualTransactionValidationFormSchema,
     NotVaccinatedFormSchema,
@@ -62,8 +83,10 @@ from server.schema import (
     UserSchema,
     VaccinatedFormSchema,
     VaccinationSchema,
-    ValidationStatsSchema,
     WaiverFormSchema,
+    with_player_relations,
+    with_registration_players,
+    with_transaction_relations,
 )
 from server.top_score_utils import TopScoreClient
 from server.utils import (
@@ -83,6 +106,53 @@ class AuthenticatedHttpRequest(HttpRequest):
 
 message_response = dict[str, str]
 
+# Webhooks received, and duplicate payment confirmations skipped, per process
+payment_stats: Counter[str] = Counter()
+
+
+def stream_json_list(objects: Iterable[Any], schema: type[Schema]) -> StreamingHttpResponse:
+    # NOTE: Serialize one object at a time, and let Django send out the chunks
+    # as they are produced, so that large lists are never held in memory.
+    def generate() -> Iterator[str]:
+        yield "["
+        for i, obj in enumerate(objects):
+            if i > 0:
+                yield ","
+            yield json.dumps(schema.from_orm(obj).dict(), cls=NinjaJSONEncoder)
+        yield "]"
+
+    return StreamingHttpResponse(generate(), content_type="application/json")
+
+
+def compute_etag(*parts: Any) -> str:
+    # NOTE: ETags are computed from the versions of the data (and the request
+    # parameters), so that unchanged data is neither fetched nor serialized.
+    data = json.dumps(parts, cls=NinjaJSONEncoder).encode("utf8")
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def get_data_versions(*names: str) -> dict[str, int]:
+    return dict(DataVersion.objects.filter(name__in=names).values_list("name", "version"))
+
+
+def is_not_modified(request: HttpRequest, etag: str) -> bool:
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    # If-None-Match uses the weak comparison
+    return "*" in etags or etag in {e.removeprefix("W/") for e in etags}
+
+
+def set_etag(response: HttpResponse | StreamingHttpResponse, etag: str) -> None:
+    response["ETag"] = etag
+    # Clients may cache the responses, but need to revalidate them each time
+    response["Cache-Control"] = "private, no-cache"
+
+
+def not_modified_response(etag: str) -> HttpResponse:
+    response = HttpResponse(status=304)
+    set_etag(response, etag)
+    return response
+
+
 # User #########
 
 
@@ -96,19 +166,121 @@ def me(request: AuthenticatedHttpRequest) -> User:
 
 @api.get("/players")
 def list_players(
-    request: AuthenticatedHttpRequest, full_schema: bool = False
-) -> list[PlayerTinySchema | PlayerSchema]:
-    players = Player.objects.all()
-    is_staff = request.user.is_staff
-    if is_staff and full_schema:
-        return [PlayerSchema.from_orm(p) for p in players]
+    request: AuthenticatedHttpRequest,
+    response: HttpResponse,
+    full_schema: bool = False,
+    stream: bool = False,
+    after: int | None = None,
+    limit: int | None = None,
+    state_ut: str | None = None,
+    team_id: int | None = None,
+    has_membership: bool | None = None,
+    sponsored: bool | None = None,
+    is_minor: bool | None = None,
+    q: str | None = None,
+) -> list[PlayerTinySchema | PlayerSchema] | StreamingHttpResponse | HttpResponse:
+    full_schema = full_schema and request.user.is_staff
+    etag = compute_etag(
+        get_data_versions(DataVersion.NameChoices.PLAYERS),
+        sorted(request.GET.lists()),
+        full_schema,
+        # Whether players are minors (listed, or filtered on) depends on the date
+        now().date(),
+    )
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    players = filter_players(
+        Player.objects.all(),
+        state_ut=state_ut,
+        team_id=team_id,
+        has_membership=has_membership,
+        sponsored=sponsored,
+        is_minor=is_minor,
+        q=q,
+    ).order_by("id")
+
+    if limit is None and stream:
+        schema = PlayerSchema if full_schema else PlayerTinySchema
+        total = players.count()
+        players = with_player_relations(players, full_schema)
+        streaming_response = stream_json_list(
+            players.iterator(chunk_size=STREAMING_CHUNK_SIZE), schema
+        )
+        streaming_response["X-Total-Count"] = str(total)
+        set_etag(streaming_response, etag)
+        return streaming_response
+
+    elif limit is None:
+        # NOTE: Without a limit, all the (filtered) players are returned, as
+        # the frontend currently expects
+        page = list(with_player_relations(players, full_schema))
+        response["X-Total-Count"] = str(len(page))
     else:
-        return [PlayerTinySchema.from_orm(p) for p in players]
+        limit = min(max(limit, 1), PLAYERS_PAGE_SIZE_MAX)
+        response["X-Total-Count"] = str(players.count())
+        if after is not None:
+            players = players.filter(id__gt=after)
+        # Fetch one extra row to know if there is a next page
+        page = list(with_player_relations(players, full_schema)[: limit + 1])
+        if len(page) > limit:
+            page = page[:limit]
+            response["X-Next-Cursor"] = str(page[-1].id)
+
+    set_etag(response, etag)
+    if full_schema:
+        return [PlayerSchema.from_orm(p) for p in page]
+    else:
+        return [PlayerTinySchema.from_orm(p) for p in page]
+
+
+def filter_players(
+    players: QuerySet[Player],
+    state_ut: str | None = None,
+    team_id: int | None = None,
+    has_membership: bool | None = None,
+    sponsored: bool | None = None,
+    is_minor: bool | None = None,
+    q: str | None = None,
+) -> QuerySet[Player]:
+    if state_ut is not None:
+        players = players.filter(state_ut=state_ut)
+    if team_id is not None:
+        players = players.filter(teams__id=team_id)
+    if has_membership is not None:
+        active = Q(membership__is_active=True)
+        players = players.filter(active) if has_membership else players.exclude(active)
+    if sponsored is not None:
+        players = players.filter(sponsored=sponsored)
+    if is_minor is not None:
+        today = now().date()
+        try:
+            major_dob = today.replace(year=today.year - MAJOR_AGE)
+        except ValueError:
+            # Today is Feb 29th
+            major_dob = today.replace(year=today.year - MAJOR_AGE, day=28)
+        minor = Q(date_of_birth__gt=major_dob)
+        players = players.filter(minor) if is_minor else players.exclude(minor)
+    if q:
+        for term in q.split():
+            players = players.filter(
+                Q(user__first_name__icontains=term)
+                | Q(user__last_name__icontains=term)
+                | Q(city__icontains=term)
+            )
+    return players
 
 
 # Teams #########
 @api.get("/teams", response={200: list[TeamSchema]})
-def list_teams(request: AuthenticatedHttpRequest) -> QuerySet[Team]:
+def list_teams(
+    request: AuthenticatedHttpRequest, response: HttpResponse
+) -> QuerySet[Team] | HttpResponse:
+    etag = compute_etag(get_data_versions(DataVersion.NameChoices.TEAMS))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    set_etag(response, etag)
     return Team.objects.all()
 
 
@@ -293,8 +465,18 @@ def register_ward(
 
 
 @api.get("/events", response={200: list[EventSchema]})
-def list_events(request: AuthenticatedHttpRequest, include_all: bool = False) -> QuerySet[Event]:
+def list_events(
+    request: AuthenticatedHttpRequest, response: HttpResponse, include_all: bool = False
+) -> QuerySet[Event] | HttpResponse:
     today = now().date()
+    # Upcoming events are filtered based on today's date
+    etag = compute_etag(
+        get_data_versions(DataVersion.NameChoices.EVENTS), None if include_all else today
+    )
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    set_etag(response, etag)
     return Event.objects.all() if include_all else Event.objects.filter(start_date__gte=today)
 
 
@@ -307,13 +489,14 @@ def list_events(request: AuthenticatedHttpRequest, include_all: bool = False) ->
 )
 def list_registrations(
     request: AuthenticatedHttpRequest, event_id: int
-) -> tuple[int, QuerySet[UCRegistration] | dict[str, str]]:
+) -> tuple[int, dict[str, str]] | HttpResponse:
     try:
-        event = Event.objects.get(id=event_id)
+        event = Event.objects.select_related("uc_sync_state").get(id=event_id)
     except Event.DoesNotExist:
         return 404, {"message": f"Event with {event_id} not found."}
 
     if request.user.is_staff:
+        team_ids = None
         registrations = UCRegistration.objects.filter(event=event)
     else:
         no_uc_profile = (400, {"message": "Need a linked UC profile"})
@@ -332,7 +515,45 @@ def list_registrations(
         )
         registrations = UCRegistration.objects.filter(event=event, team_id__in=team_ids)
 
-    return 200, registrations
+    # NOTE: The serialized registrations are cached until the next import of
+    # registrations for the event changes them (and bumps the version), or
+    # the teams or players (including their memberships, etc.) change.
+    try:
+        version = event.uc_sync_state.version
+    except UCSyncState.DoesNotExist:
+        version = 0
+    data_versions = get_data_versions(
+        DataVersion.NameChoices.TEAMS, DataVersion.NameChoices.PLAYERS
+    )
+    key = registrations_cache_key(event.id, version, data_versions, team_ids)
+    etag = compute_etag(key)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    content = cache.get(key)
+    if content is None:
+        content = json.dumps(
+            [
+                UCRegistrationSchema.from_orm(registration).dict()
+                for registration in with_registration_players(registrations)
+            ],
+            cls=NinjaJSONEncoder,
+        )
+        cache.set(key, content, settings.REGISTRATIONS_CACHE_TIMEOUT)
+    response = HttpResponse(content, content_type="application/json")
+    set_etag(response, etag)
+    return response
+
+
+def registrations_cache_key(
+    event_id: int, version: int, data_versions: dict[str, int], team_ids: set[int] | None
+) -> str:
+    key = f"registrations:{event_id}:{version}"
+    for name in sorted(data_versions):
+        key += f":{name}-{data_versions[name]}"
+    if team_ids is not None:
+        key += ":" + ",".join(str(team_id) for team_id in sorted(team_ids))
+    return key
 
 
 # Payments ##########
@@ -365,7 +586,9 @@ def create_transaction(
 ) -> tuple[int, str | message_response | dict[str, Any]]:
     if isinstance(order, GroupMembershipSchema):
         group_payment = True
-        players = Player.objects.filter(id__in=order.player_ids)
+        players = list(
+            Player.objects.filter(id__in=order.player_ids).select_related("user", "membership")
+        )
         player_ids = {p.id for p in players}
         if len(player_ids) != len(order.player_ids):
             missing_players = set(order.player_ids) - player_ids
@@ -424,8 +647,18 @@ def create_transaction(
             "players": player_names,
         }
         receipt = f"group:{start_date}:{ts}"
-        for player in players:
-            Membership.objects.get_or_create(player=player, defaults=membership_defaults)
+        # NOTE: Memberships are created only for players without one, in bulk
+        new_memberships = [
+            Membership(player=player, **membership_defaults)
+            for player in players
+            if not hasattr(player, "membership")
+        ]
+        for membership in new_memberships:
+            # bulk_create doesn't send pre_save signals
+            create_membership_number(Membership, membership, raw=False)
+        Membership.objects.bulk_create(new_memberships, ignore_conflicts=True)
+        if new_memberships:
+            bump_data_versions(DataVersion.NameChoices.PLAYERS)
     else:
         membership, _ = Membership.objects.get_or_create(
             player=player,
@@ -477,6 +710,7 @@ def create_transaction(
             player__in=player_ids if group_payment else [player.id]
         )
         memberships.update(is_active=True, start_date=start_date, end_date=end_date)
+        bump_data_versions(DataVersion.NameChoices.PLAYERS)
     return 200, data
 
 
@@ -492,7 +726,7 @@ def payment_success(
     transaction = update_transaction(payment)
     if not transaction:
         return 404, {"message": "No order found."}
-    return 200, transaction.players.all()
+    return 200, with_player_relations(transaction.players.all())
 
 
 def update_transaction(payment: PaymentFormSchema) -> RazorpayTransaction | None:
@@ -501,6 +735,12 @@ def update_transaction(payment: PaymentFormSchema) -> RazorpayTransaction | None
     except RazorpayTransaction.DoesNotExist:
         return None
 
+    # NOTE: A payment may be confirmed by the browser, the webhook and the
+    # hourly sync; only the first confirmation updates the memberships.
+    if transaction.status == RazorpayTransaction.TransactionStatusChoices.COMPLETED:
+        payment_stats["already_completed"] += 1
+        return transaction
+
     n = len("razorpay_")
     for key, value in payment.dict().items():
         setattr(transaction, key[n:], value)
@@ -509,22 +749,32 @@ def update_transaction(payment: PaymentFormSchema) -> RazorpayTransaction | None
 
 def mark_transaction_completed(transaction: RazorpayTransaction) -> RazorpayTransaction:
     transaction.status = RazorpayTransaction.TransactionStatusChoices.COMPLETED
-    transaction.save()
 
-    membership_defaults = {
-        "start_date": transaction.start_date,
-        "end_date": transaction.end_date,
-        "event": transaction.event,
-        "is_active": True,
-    }
-    for player in transaction.players.all():
-        membership, created = Membership.objects.get_or_create(
-            player=player, defaults=membership_defaults
+    # NOTE: Memberships of all the players paid for are created or updated
+    # using a single upsert, irrespective of the number of players.
+    memberships = [
+        Membership(
+            player_id=player.id,
+            start_date=transaction.start_date,
+            end_date=transaction.end_date,
+            event_id=transaction.event_id,
+            is_active=True,
         )
-        if not created:
-            for key, value in membership_defaults.items():
-                setattr(membership, key, value)
-            membership.save()
+        for player in transaction.players.all()
+    ]
+    for membership in memberships:
+        # bulk_create doesn't send pre_save signals
+        create_membership_number(Membership, membership, raw=False)
+
+    with db_transaction.atomic():
+        transaction.save()
+        Membership.objects.bulk_create(
+            memberships,
+            update_conflicts=True,
+            unique_fields=["player"],
+            update_fields=["start_date", "end_date", "event", "is_active"],
+        )
+        bump_data_versions(DataVersion.NameChoices.PLAYERS)
 
     return transaction
 
@@ -536,6 +786,18 @@ def payment_webhook(request: HttpRequest) -> message_response:
     signature = request.headers.get("X-Razorpay-Signature", "")
     if not verify_razorpay_webhook_payload(body, signature):
         return {"message": "Signature could not be verified"}
+
+    payment_stats["webhooks"] += 1
+    event_id = request.headers.get("X-Razorpay-Event-Id")
+    if event_id:
+        event, created = RazorpayWebhookEvent.objects.get_or_create(event_id=event_id)
+        if not created and event.processed:
+            payment_stats["duplicate_webhooks"] += 1
+            RazorpayWebhookEvent.objects.filter(event_id=event_id).update(
+                duplicates=F("duplicates") + 1
+            )
+            return {"message": "Webhook already processed"}
+
     data = json.loads(body)["payload"]["payment"]["entity"]
     payment = PaymentFormSchema(
         razorpay_payment_id=data["id"],
@@ -543,13 +805,18 @@ def payment_webhook(request: HttpRequest) -> message_response:
         razorpay_signature=f"webhook_{signature}",
     )
     update_transaction(payment)
+    if event_id:
+        RazorpayWebhookEvent.objects.filter(event_id=event_id).update(processed=True)
     return {"message": "Webhook processed"}
 
 
 @api.get("/transactions", response={200: list[TransactionSchema]})
 def list_transactions(
-    request: AuthenticatedHttpRequest, include_all: bool = False, only_invalid: bool = False
-) -> QuerySet[ManualTransaction]:
+    request: AuthenticatedHttpRequest,
+    include_all: bool = False,
+    only_invalid: bool = False,
+    stream: bool = False,
+) -> QuerySet[ManualTransaction] | StreamingHttpResponse:
     user = request.user
 
     if include_all and user.is_staff:
@@ -560,30 +827,43 @@ def list_transactions(
         )
 
     else:
-        # Get ids of all associated players of a user (player + wards)
-        ward_ids = set(user.guardianship_set.values_list("player_id", flat=True))
-        player_id = set(Player.objects.filter(user=user).values_list("id", flat=True))
-        player_ids = ward_ids.union(player_id)
-
-        query = Q(user=request.user) | Q(players__in=player_ids)
+        # NOTE: Transactions of the associated players of a user (player +
+        # wards) are looked up as a subquery on the players through table,
+        # instead of a join, which would need a DISTINCT.
+        TransactionPlayer = ManualTransaction.players.through  # noqa: N806
+        player_transactions = TransactionPlayer.objects.filter(
+            Q(player_id__in=Player.objects.filter(user=user).values("id"))
+            | Q(player_id__in=user.guardianship_set.values("player_id"))
+        ).values("manualtransaction_id")
+
+        query = Q(user=request.user) | Q(transaction_id__in=player_transactions)
         transactions = ManualTransaction.objects.filter(query)
         if only_invalid:
             transactions = transactions.filter(validated=False)
 
-    return transactions.distinct().order_by("-payment_date")
+    transactions = with_transaction_relations(transactions.order_by("-payment_date"))
+    if stream:
+        return stream_json_list(
+            transactions.iterator(chunk_size=STREAMING_CHUNK_SIZE), TransactionSchema
+        )
+    return transactions
 
 
-@api.post("/validate-transactions", response={200: ValidationStatsSchema, 400: Response})
+@api.post("/validate-transactions", response={200: JobSchema, 400: Response})
 def validate_transactions(
     request: AuthenticatedHttpRequest,
     bank_statement: UploadedFile = File(...),  # noqa: B008
-) -> tuple[int, message_response] | tuple[int, dict[str, int]]:
-    if not bank_statement.name or not bank_statement.name.endswith(".csv"):
+) -> tuple[int, message_response] | tuple[int, Job]:
+    name = bank_statement.name
+    if not name or not name.endswith((".csv", ".csv.gz")):
         return 400, {"message": "Please upload a CSV file!"}
 
-    text = bank_statement.read().decode("utf-8")
-    stats = validate_manual_transactions(io.StringIO(text))
-    return 200, stats
+    # NOTE: The statement is validated by the job worker; the status and
+    # the results of the validation can be polled using the job id.
+    job = enqueue_job(
+        Job.KindChoices.VALIDATE_TRANSACTIONS, user=request.user, input_file=bank_statement
+    )
+    return 200, job
 
 
 @api.post("/validate-transaction", response={200: TransactionSchema, 400: Response})
@@ -601,6 +881,53 @@ def validate_transaction(
     return 200, transaction
 
 
+# Jobs ##########
+
+
+@api.get("/jobs/{int:job_id}", response={200: JobSchema, 404: Response})
+def get_job(request: AuthenticatedHttpRequest, job_id: int) -> tuple[int, Job | message_response]:
+    jobs = (
+        Job.objects.all() if request.user.is_staff else Job.objects.filter(created_by=request.user)
+    )
+    try:
+        job = jobs.get(id=job_id)
+    except Job.DoesNotExist:
+        return 404, {"message": "Job does not exist"}
+    return 200, job
+
+
+@api.post("/jobs/import-members-data", response={200: JobSchema, 400: Response, 403: Response})
+def import_members_data_job(
+    request: AuthenticatedHttpRequest,
+    data: ImportMembersJobFormSchema = Form(...),  # noqa: B008
+    members_data: UploadedFile = File(...),  # noqa: B008
+) -> tuple[int, Job | message_response]:
+    if not request.user.is_staff:
+        return 403, {"message": "Only admins can import members data"}
+
+    if not members_data.name or not members_data.name.endswith(".csv"):
+        return 400, {"message": "Please upload a CSV file!"}
+
+    job = enqueue_job(
+        Job.KindChoices.IMPORT_MEMBERS_DATA,
+        user=request.user,
+        params=data.dict(),
+        input_file=members_data,
+    )
+    return 200, job
+
+
+@api.post("/jobs/sync-razorpay-transactions", response={200: JobSchema, 403: Response})
+def sync_razorpay_transactions_job(
+    request: AuthenticatedHttpRequest,
+) -> tuple[int, Job | message_response]:
+    if not request.user.is_staff:
+        return 403, {"message": "Only admins can sync transactions"}
+
+    job = enqueue_job(Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS, user=request.user)
+    return 200, job
+
+
 # Vaccination ##########
 
 
@@ -4,3 +4,6 @@ ANNUAL_MEMBERSHIP_AMOUNT = 650 * 100
 SPONSORED_ANNUAL_MEMBERSHIP_AMOUNT = 350 * 100
 EVENT_MEMBERSHIP_AMOUNT = 375 * 100
 MAJOR_AGE = 18
+PLAYERS_PAGE_SIZE_MAX = 500
+STREAMING_CHUNK_SIZE = 500
+BANK_STATEMENT_CHUNK_SIZE = 1000
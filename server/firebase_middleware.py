@@ -1,15 +1,26 @@
 import base64
+import hashlib
 import json
+import logging
 import os
+import time
+from collections import Counter
 from pathlib import Path
 from typing import Any
 
 import firebase_admin
+from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpRequest, HttpResponse
 from firebase_admin import auth, credentials
 
 from server.models import User
 
+logger = logging.getLogger(__name__)
+
+# Hits and misses of the verified token cache, per process
+token_cache_stats: Counter[str] = Counter()
+
 
 def firebase_to_django_user(firebase_user: auth.UserRecord) -> User | None:
     if firebase_user is None:
@@ -30,30 +41,76 @@ def firebase_to_django_user(firebase_user: auth.UserRecord) -> User | None:
     return user
 
 
+def token_cache_key(firebase_token: str) -> str:
+    digest = hashlib.sha256(firebase_token.encode("utf8")).hexdigest()
+    return f"firebase-token:{digest}"
+
+
 class FirebaseAuthenticationMiddleware:
     def __init__(self, get_response: Any) -> None:
         self.get_response = get_response
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not request.path.startswith(tuple(settings.FIREBASE_AUTH_PATHS)):
+            return self.get_response(request)
+
         self.initialize_firebase_app()
 
         # Check if the user is authenticated with Firebase
         firebase_token = request.session.get("firebase_token")
-        if firebase_token:
-            try:
-                decoded_token = auth.verify_id_token(firebase_token)
-                uid = decoded_token["uid"]
-                firebase_user = auth.get_user(uid)
-                user = firebase_to_django_user(firebase_user)
-                if user is not None:
-                    request.user = user
-            except (auth.InvalidIdTokenError, ValueError):
-                # Invalid token, user is not authenticated
-                pass
+        if firebase_token and not self.verified_recently(request):
+            user = self.get_cached_user(firebase_token)
+            if user is None:
+                user = self.verify_token(firebase_token)
+            if user is not None:
+                request.user = user
+                request.session["firebase_token_verified_at"] = int(time.time())
 
         response = self.get_response(request)
         return response
 
+    def verified_recently(self, request: HttpRequest) -> bool:
+        # NOTE: The session user is the same as the Firebase user, since
+        # firebase_login logs in the user into the session.
+        verified_at = request.session.get("firebase_token_verified_at")
+        if verified_at is None or not request.user.is_authenticated:
+            return False
+        return time.time() - verified_at < settings.FIREBASE_TOKEN_REVERIFY_SECONDS
+
+    def get_cached_user(self, firebase_token: str) -> User | None:
+        key = token_cache_key(firebase_token)
+        user_id = cache.get(key)
+        if user_id is None:
+            token_cache_stats["misses"] += 1
+            return None
+
+        token_cache_stats["hits"] += 1
+        try:
+            return User.objects.get(id=user_id)
+        except User.DoesNotExist:
+            cache.delete(key)
+            return None
+
+    def verify_token(self, firebase_token: str) -> User | None:
+        try:
+            decoded_token = auth.verify_id_token(firebase_token)
+            uid = decoded_token["uid"]
+            firebase_user = auth.get_user(uid)
+        except (auth.InvalidIdTokenError, ValueError):
+            # Invalid token, user is not authenticated
+            return None
+
+        user = firebase_to_django_user(firebase_user)
+        if user is None:
+            return None
+
+        # Cache the verified token only until it expires
+        timeout = int(decoded_token.get("exp", 0) - time.time())
+        if timeout > 0:
+            cache.set(token_cache_key(firebase_token), user.id, timeout=timeout)
+            logger.debug("Cached verified Firebase token for %s seconds", timeout)
+        return user
+
     def initialize_firebase_app(self) -> None:
         # In tests, the middleware is instantiated multiple times and causes
         # firebase initialization errors. This ensures that the initialization
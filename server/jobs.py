@@ -0,0 +1,124 @@
+import datetime
+import logging
+import traceback
+from collections.abc import Callable
+from io import StringIO
+from typing import Any
+
+from django.core.files import File
+from django.core.management import call_command
+from django.utils.timezone import now
+
+from server.manual_transactions import open_bank_statement, validate_manual_transactions
+from server.models import Job, User
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Job], dict[str, Any]]
+
+
+def enqueue_job(
+    kind: str,
+    user: User | None = None,
+    params: dict[str, Any] | None = None,
+    input_file: File[Any] | None = None,
+) -> Job:
+    job = Job(kind=kind, created_by=user, params=params or {})
+    if input_file is not None:
+        job.input_file.save(input_file.name or "input", input_file, save=False)
+    job.save()
+    return job
+
+
+def claim_next_job() -> Job | None:
+    # NOTE: A job is claimed by the worker whose conditional UPDATE changes
+    # its status, which is safe with multiple workers without row locks.
+    queued = Job.objects.filter(status=Job.StatusChoices.QUEUED).order_by("created_at")
+    for job in queued[:10]:
+        claimed = Job.objects.filter(id=job.id, status=Job.StatusChoices.QUEUED).update(
+            status=Job.StatusChoices.RUNNING, started_at=now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def fail_stale_jobs(timeout: datetime.timedelta) -> list[Job]:
+    # NOTE: Jobs left running by a worker that was killed, say during a
+    # deploy, are marked as failed instead of being polled for forever.
+    # They are not retried, since they may have been partially run.
+    stale = Job.objects.filter(
+        status=Job.StatusChoices.RUNNING, started_at__lt=now() - timeout
+    ).order_by("started_at")
+    failed = []
+    for job in stale:
+        claimed = Job.objects.filter(id=job.id, status=Job.StatusChoices.RUNNING).update(
+            status=Job.StatusChoices.FAILED,
+            error=f"Job did not finish within {timeout}; the worker may have been stopped.",
+            finished_at=now(),
+        )
+        if claimed:
+            delete_input_file(job)
+            failed.append(job)
+    return failed
+
+
+def run_job(job: Job) -> None:
+    handler = JOB_HANDLERS[job.kind]
+    try:
+        job.result = handler(job)
+    except Exception:
+        logger.exception("Job %s failed", job)
+        job.status = Job.StatusChoices.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = Job.StatusChoices.SUCCEEDED
+    job.finished_at = now()
+    job.save(update_fields=["status", "result", "error", "finished_at"])
+    delete_input_file(job)
+
+
+def delete_input_file(job: Job) -> None:
+    # Input files, like bank statements, are not needed once a job finishes
+    if job.input_file:
+        job.input_file.delete(save=False)
+        job.save(update_fields=["input_file"])
+
+
+def update_progress(job: Job, progress: int) -> None:
+    job.progress = progress
+    job.save(update_fields=["progress"])
+
+
+def validate_transactions(job: Job) -> dict[str, Any]:
+    with job.input_file.open("rb") as f:
+        bank_statement = open_bank_statement(f, job.input_file.name)
+        return validate_manual_transactions(
+            bank_statement, on_progress=lambda n: update_progress(job, n)
+        )
+
+
+def import_members_data(job: Job) -> dict[str, Any]:
+    stdout = StringIO()
+    call_command(
+        "import_members_data",
+        job.input_file.path,
+        minors=job.params.get("minors", False),
+        dry_run=job.params.get("dry_run", False),
+        stdout=stdout,
+    )
+    return {"output": stdout.getvalue()}
+
+
+def sync_razorpay_transactions(job: Job) -> dict[str, Any]:
+    stdout = StringIO()
+    call_command("sync_razorpay_transactions", stdout=stdout)
+    return {"output": stdout.getvalue()}
+
+
+JOB_HANDLERS: dict[str, JobHandler] = {
+    Job.KindChoices.VALIDATE_TRANSACTIONS: validate_transactions,
+    Job.KindChoices.IMPORT_MEMBERS_DATA: import_members_data,
+    Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS: sync_razorpay_transactions,
+}
@@ -1,20 +1,35 @@
 import csv
 import datetime
+import itertools
+import json
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field, fields
 from pathlib import Path
 from typing import Any
 from urllib.parse import urlparse
 
-from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError
+from django.core.files import File
 from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
 from django.utils.dateparse import parse_date
 from django.utils.regex_helper import _lazy_re_compile
 from django.utils.text import slugify
 
-from server.models import Guardianship, Membership, Player, UCPerson, UCRegistration, Vaccination
-
-User = get_user_model()
-
+from server.models import (
+    DataVersion,
+    Guardianship,
+    Membership,
+    Player,
+    UCPerson,
+    UCRegistration,
+    User,
+    Vaccination,
+    bump_data_versions,
+    create_membership_number,
+)
 
 DATE_RE = _lazy_re_compile(r"(?P<day>\d{1,2})/(?P<month>\d{1,2})/(?P<year>\d{4})$")
 
@@ -128,6 +143,35 @@ def clean_occupation(occupation: str | None) -> str | None:
     return OCCUPATIONS[cleaned] if cleaned in OCCUPATIONS else None
 
 
+def chunked(rows: Iterable[dict[str, str]], size: int) -> Iterator[list[dict[str, str]]]:
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+@dataclass
+class Member:
+    # NOTE: Unsaved model instances created from a row of the CSV file
+    row: int
+    user: User
+    player: Player
+    membership: Membership
+    vaccination: Vaccination | None
+    certificate_path: Path | None = None
+    guardian: User | None = None
+    guardianship: Guardianship | None = None
+    team_ids: set[int] = field(default_factory=set)
+
+
+@dataclass
+class Issue:
+    row: int
+    name: str
+    column: str
+    level: str
+    message: str
+
+
 class Command(BaseCommand):
     help = "Import members data from CSV"
 
@@ -147,6 +191,29 @@ class Command(BaseCommand):
         parser.add_argument(
             "--download-path", type=Path, help="Path of parent directory containing downloaded data"
         )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of rows to import in each DB transaction",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of threads used to copy vaccination certificates",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Only validate the data, without importing anything",
+        )
+        parser.add_argument(
+            "--report",
+            type=Path,
+            help="Path to write a report of invalid rows to (.csv or .json)",
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
         gdrive_map_csv = options["gdrive_map_csv"]
@@ -160,207 +227,412 @@ class Command(BaseCommand):
             with gdrive_map_csv.open("r") as file:
                 reader = csv.DictReader(file)
                 gdrive_map = {row["File ID"]: download_path / row["File Path"] for row in reader}
+        self.gdrive_map = gdrive_map
 
         if UCPerson.objects.count() == 0:
             raise CommandError(
                 "No UC profiles found; Linking to UC profiles will not work correctly."
             )
 
-        minors = options["minors"]
+        self.minors = options["minors"]
+        self.columns = MINORS_COLUMNS if self.minors else ADULTS_COLUMNS
         csv_file = options["csv_file"]
-        columns = MINORS_COLUMNS if minors else ADULTS_COLUMNS
         if not csv_file.exists():
             raise CommandError(f"'{csv_file}' does not exist.")
-        with csv_file.open("r") as file:
+
+        dry_run = options["dry_run"]
+        report_path = options["report"]
+        if report_path and report_path.suffix not in {".csv", ".json"}:
+            raise CommandError("The report should be a .csv or a .json file.")
+
+        self.load_lookups()
+        start = time.monotonic()
+        n_rows = n_imported = 0
+        self.issues: list[Issue] = []
+        # NOTE: Certificates are copied to the storage in a thread pool, while
+        # the rows are being imported. The vaccinations are updated with the
+        # names of the copied files once all the copies have finished.
+        self.copies: list[tuple[Future[str], Vaccination, str]] = []
+        with csv_file.open("r") as file, ThreadPoolExecutor(options["workers"]) as executor:
+            self.executor = executor
             reader = csv.DictReader(file)
-            for row_ in reader:
-                row = {key.strip(): value.strip() for key, value in row_.items()}
-                email = row[columns["email"]] if not minors else ""
-                iu_profile = clean_india_ultimate_profile(row[columns["india_ultimate_profile"]])
-
-                uc_person = None
-                if iu_profile:
-                    uc_slug = urlparse(iu_profile).path.strip("/").rsplit("/", 1)[-1]
-                    try:
-                        uc_person = UCPerson.objects.get(slug=uc_slug)
-                    except UCPerson.DoesNotExist:
-                        uc_person = None
-
-                elif email:
-                    try:
-                        uc_person = UCPerson.objects.get(email=email)
-                    except (UCPerson.DoesNotExist, UCPerson.MultipleObjectsReturned):
-                        uc_person = None
-
-                if not email and uc_person:
-                    email = uc_person.email
-
-                first_name = row[columns["first_name"]]
-                last_name = row[columns["last_name"]]
-                name = f"{first_name} {last_name}"
-                if not email:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"Skipping import of user with missing email: {slugify(name)}."
-                        )
-                    )
-                    continue
-
-                date_of_birth = parse_date_custom(row[columns["dob"]])
-                if date_of_birth is None:
-                    print(f"Couldn't parse date of birth for {name}. Skipping")
-                    continue
-
-                phone = clean_phone(row[columns["phone"]])
-                # Create or get the User instance
-                user, created = User.objects.get_or_create(
-                    username=email.lower(),
-                    defaults={
-                        "email": email.lower(),
-                        "phone": phone,
-                        "first_name": first_name,
-                        "last_name": last_name,
-                    },
-                )
+            try:
+                for chunk in chunked(reader, options["chunk_size"]):
+                    members = []
+                    for row_ in chunk:
+                        n_rows += 1
+                        row = {key.strip(): value.strip() for key, value in row_.items()}
+                        member = self.parse_row(row, n_rows)
+                        if member is not None:
+                            members.append(member)
+                    if dry_run:
+                        n_imported += len(members)
+                        continue
+                    members = self.skip_conflicts(members)
+                    self.add_team_ids(members)
+                    self.import_members(members)
+                    n_imported += len(members)
+            finally:
+                # Certificates of the chunks already imported are saved, even
+                # if importing a later chunk fails
+                if not dry_run:
+                    self.save_certificates()
+
+        if report_path:
+            self.write_report(report_path)
+
+        elapsed = time.monotonic() - start
+        rate = n_rows / elapsed if elapsed > 0 else n_rows
+        n_errors = len({issue.row for issue in self.issues if issue.level == "error"})
+        n_warnings = len({issue.row for issue in self.issues if issue.level == "warning"})
+        verb = "Validated" if dry_run else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {n_imported} of {n_rows} rows in {elapsed:.2f}s ({rate:.0f} rows/second); "
+                f"{n_errors} rows with errors, {n_warnings} rows with warnings"
+            )
+        )
+
+    def report(self, row: int, name: str, column: str, message: str, level: str = "error") -> None:
+        self.issues.append(Issue(row, name, self.columns.get(column, column), level, message))
+        style = self.style.ERROR if level == "error" else self.style.WARNING
+        self.stdout.write(style(f"Row {row} ({name}): {message}"))
+
+    def write_report(self, path: Path) -> None:
+        issues = [asdict(issue) for issue in self.issues]
+        with path.open("w") as f:
+            if path.suffix == ".json":
+                json.dump(issues, f, indent=2)
+            else:
+                writer = csv.DictWriter(f, fieldnames=[f.name for f in fields(Issue)])
+                writer.writeheader()
+                writer.writerows(issues)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(issues)} issues to {path}"))
+
+    def load_lookups(self) -> None:
+        # NOTE: Slugs and emails that are shared by multiple UC profiles are
+        # mapped to None, since the profile can't be identified uniquely.
+        self.uc_persons_by_slug: dict[str, UCPerson | None] = {}
+        self.uc_persons_by_email: dict[str, UCPerson | None] = {}
+        for person in UCPerson.objects.all():
+            for key, lookup in [
+                (person.slug, self.uc_persons_by_slug),
+                (person.email, self.uc_persons_by_email),
+            ]:
+                lookup[key] = None if key in lookup else person
+
+        # Users already in the DB, and those to be created, by username
+        self.users: dict[str, User] = {user.username: user for user in User.objects.all()}
+
+        # UC profiles already linked to players in the DB, or to be created
+        self.uc_ids: set[int | None] = set(
+            Player.objects.filter(ultimate_central_id__isnull=False).values_list(
+                "ultimate_central_id", flat=True
+            )
+        )
+
+    def find_uc_person(self, row: dict[str, str], email: str) -> UCPerson | None:
+        iu_profile = clean_india_ultimate_profile(row[self.columns["india_ultimate_profile"]])
+        if iu_profile:
+            uc_slug = urlparse(iu_profile).path.strip("/").rsplit("/", 1)[-1]
+            return self.uc_persons_by_slug.get(uc_slug)
+        elif email:
+            return self.uc_persons_by_email.get(email)
+        return None
 
-                if not created:
-                    # Use the data from the first available row
-                    continue
-
-                gender = row[columns["gender"]]
-                if gender in GENDERS:
-                    gender = GENDERS[gender]
-                    other_gender = None
-                else:
-                    other_gender = gender
-                    gender = GENDERS["Other"]
-
-                state_ut = row[columns["state_ut"]]
-                if state_ut in STATE_UT:
-                    state_ut = STATE_UT[state_ut]
-                    not_in_india = False
-                else:
-                    not_in_india = True
-                    state_ut = None
-
-                occupation = (
-                    clean_occupation(row[columns["occupation"]]) if not minors else "Student"
+    def parse_row(self, row: dict[str, str], line: int) -> Member | None:
+        columns = self.columns
+        minors = self.minors
+        email = row[columns["email"]] if not minors else ""
+        uc_person = self.find_uc_person(row, email)
+        if not email and uc_person:
+            email = uc_person.email
+
+        first_name = row[columns["first_name"]]
+        last_name = row[columns["last_name"]]
+        name = f"{first_name} {last_name}"
+        if not email:
+            self.report(line, name, "email", "Missing email")
+            return None
+
+        date_of_birth = parse_date_custom(row[columns["dob"]])
+        if date_of_birth is None:
+            self.report(line, name, "dob", f"Couldn't parse date of birth: {row[columns['dob']]}")
+            return None
+
+        username = email.lower()
+        if username in self.users:
+            # Use the data from the first available row
+            message = "Duplicate email" if self.users[username]._state.adding else "User exists"
+            self.report(line, name, "email", f"{message}: {username}", level="info")
+            return None
+
+        if uc_person is not None and uc_person.id in self.uc_ids:
+            message = f"UC profile already linked to another player: {uc_person.slug}"
+            self.report(line, name, "india_ultimate_profile", message)
+            return None
+
+        user = User(
+            username=username,
+            email=username,
+            phone=clean_phone(row[columns["phone"]]),
+            first_name=first_name,
+            last_name=last_name,
+        )
+
+        gender = row[columns["gender"]]
+        if gender in GENDERS:
+            gender = GENDERS[gender]
+            other_gender = None
+        else:
+            other_gender = gender
+            gender = GENDERS["Other"]
+            self.report(line, name, "gender", f"Unknown gender: {other_gender}", level="warning")
+
+        state_ut: str | None = row[columns["state_ut"]]
+        if state_ut in STATE_UT:
+            state_ut = STATE_UT[state_ut]
+            not_in_india = False
+        else:
+            if state_ut != VALUES["not_in_india"]:
+                self.report(line, name, "state_ut", f"Unknown State/UT: {state_ut}", "warning")
+            not_in_india = True
+            state_ut = None
+
+        occupation = clean_occupation(row[columns["occupation"]]) if not minors else "Student"
+        if occupation is None and row[columns["occupation"]]:
+            message = f"Unknown occupation: {row[columns['occupation']]}"
+            self.report(line, name, "occupation", message, level="warning")
+
+        player = Player(
+            user=user,
+            date_of_birth=date_of_birth,
+            gender=gender,
+            other_gender=other_gender,
+            city=row[columns["city"]],
+            state_ut=state_ut,
+            not_in_india=not_in_india,
+            occupation=occupation,
+            educational_institution=row[columns["educational_institution"]] if minors else None,
+            ultimate_central_id=uc_person.id if uc_person else None,
+            imported_data=True,
+        )
+
+        guardian_user = guardianship = None
+        if minors:
+            guardian_email = row[columns["guardian_email"]]
+            guardian_name = row[columns["guardian_name"]]
+            if not guardian_email:
+                guardian_email = slugify(guardian_name)
+            guardian_username = guardian_email.lower()
+            guardian_user = self.users.get(guardian_username)
+            if guardian_user is None:
+                g_first_name, g_last_name = ([*guardian_name.strip().split(), "", ""])[:2]
+                guardian_user = User(
+                    username=guardian_username,
+                    email=guardian_username,
+                    phone=clean_phone(row[columns["guardian_phone"]]),
+                    first_name=g_first_name,
+                    last_name=g_last_name,
                 )
+            relation = row[columns["guardian_relation"]]
+            guardianship = Guardianship(
+                user=guardian_user, player=player, relation=RELATIONS.get(relation, relation)
+            )
 
-                # Create the Player instance
-                player = Player(
-                    user=user,
-                    date_of_birth=date_of_birth,
-                    gender=gender,
-                    other_gender=other_gender,
-                    city=row[columns["city"]],
-                    state_ut=state_ut,
-                    not_in_india=not_in_india,
-                    occupation=occupation,
-                    educational_institution=row[columns["educational_institution"]]
-                    if minors
-                    else None,
-                    ultimate_central_id=uc_person.id if uc_person else None,
-                    imported_data=True,
+        membership = Membership(
+            player=player,
+            is_annual=row[columns["membership_type"]] == "Full Member (INR 600/person)",
+            start_date="2022-04-01",
+            end_date="2023-03-31",
+            is_active=False,
+        )
+
+        is_vaccinated = row[columns["is_vaccinated"]] == "Yes"
+        reason = row[columns["not_vaccinated_reason"]]
+        vaccination_name = row[columns["vaccination_name"]]
+        if minors:
+            explanation = reason
+        else:
+            explanation = row[columns["not_vaccinated_explanation"]]
+            explanation = f"{reason}\n{explanation}".strip()
+        if vaccination_name and vaccination_name not in VACCINATIONS:
+            message = f"Unknown vaccination: {vaccination_name}"
+            self.report(line, name, "vaccination_name", message, level="warning")
+        vaccination: Vaccination | None = Vaccination(
+            player=player,
+            is_vaccinated=is_vaccinated,
+            name=VACCINATIONS.get(vaccination_name, None),
+            explain_not_vaccinated=explanation,
+        )
+
+        # NOTE: Uniqueness and relations are checked against the lookups, and
+        # are excluded from validation to avoid per row DB queries.
+        n_issues = len(self.issues)
+        to_validate = [(player, ["user"]), (guardianship, ["user", "player"])]
+        for obj, exclude in [*to_validate, (vaccination, ["player"])]:
+            if obj is None:
+                continue
+            try:
+                obj.full_clean(exclude=exclude, validate_unique=False)
+            except ValidationError as e:
+                for key, messages in e.message_dict.items():
+                    for message in messages:
+                        self.report(line, name, key, f"Invalid {key}: {message}")
+        if any(issue.level == "error" for issue in self.issues[n_issues:]):
+            return None
+
+        certificate_url = row[columns["certificate"]] if is_vaccinated else None
+        certificate_path = None
+        if certificate_url:
+            certificate_path = self.find_vaccination_file(certificate_url, self.gdrive_map)
+            if certificate_path is None:
+                message = "Not saving vaccination info; missing certificate"
+                self.report(line, name, "certificate", message, level="warning")
+                vaccination = None
+
+        self.users[username] = user
+        if uc_person is not None:
+            self.uc_ids.add(uc_person.id)
+        if guardian_user is not None:
+            self.users[guardian_user.username] = guardian_user
+        return Member(
+            row=line,
+            user=user,
+            player=player,
+            membership=membership,
+            vaccination=vaccination,
+            certificate_path=certificate_path,
+            guardian=guardian_user,
+            guardianship=guardianship,
+        )
+
+    def skip_conflicts(self, members: list[Member]) -> list[Member]:
+        # NOTE: Users and players may have been created since the lookups were
+        # loaded. Rows conflicting with them are skipped, instead of failing
+        # the import of the whole chunk with an IntegrityError.
+        if not members:
+            return members
+        new_guardians = {
+            m.row: m.guardian.username for m in members if m.guardian and m.guardian._state.adding
+        }
+        usernames = set(
+            User.objects.filter(
+                username__in=[m.user.username for m in members] + list(new_guardians.values())
+            ).values_list("username", flat=True)
+        )
+        uc_ids = set(
+            Player.objects.filter(
+                ultimate_central_id__in=[m.player.ultimate_central_id for m in members]
+            ).values_list("ultimate_central_id", flat=True)
+        )
+        valid = []
+        for m in members:
+            name = m.user.get_full_name()
+            conflicts = {m.user.username, new_guardians.get(m.row, m.user.username)} & usernames
+            if conflicts:
+                message = f"User created during import: {', '.join(sorted(conflicts))}"
+                self.report(m.row, name, "email", message)
+            elif m.player.ultimate_central_id in uc_ids:
+                message = "UC profile linked to another player during import"
+                self.report(m.row, name, "india_ultimate_profile", message)
+            else:
+                valid.append(m)
+        return valid
+
+    def add_team_ids(self, members: list[Member]) -> None:
+        uc_ids = {m.player.ultimate_central_id for m in members if m.player.ultimate_central_id}
+        team_ids: dict[int, set[int]] = {}
+        registrations = UCRegistration.objects.filter(person_id__in=uc_ids)
+        for person_id, team_id in registrations.values_list("person_id", "team_id"):
+            team_ids.setdefault(person_id, set()).add(team_id)
+        for member in members:
+            uc_id = member.player.ultimate_central_id
+            if uc_id is not None:
+                member.team_ids = team_ids.get(uc_id, set())
+
+    def import_members(self, members: list[Member]) -> None:
+        vaccinations = [m.vaccination for m in members if m.vaccination is not None]
+        certificates = [
+            (m.vaccination, m.certificate_path, m.user.username)
+            for m in members
+            if m.vaccination is not None and m.certificate_path is not None
+        ]
+
+        with transaction.atomic():
+            # NOTE: Guardians may be shared by multiple minors, or already exist
+            guardians = {m.guardian.username: m.guardian for m in members if m.guardian is not None}
+            new_guardians = [guardian for guardian in guardians.values() if guardian._state.adding]
+            User.objects.bulk_create([m.user for m in members] + new_guardians)
+            Player.objects.bulk_create([m.player for m in members])
+            Guardianship.objects.bulk_create(
+                [m.guardianship for m in members if m.guardianship is not None]
+            )
+            memberships = [m.membership for m in members]
+            for membership in memberships:
+                create_membership_number(Membership, membership, raw=False)
+            Membership.objects.bulk_create(memberships)
+            Vaccination.objects.bulk_create(vaccinations)
+            PlayerTeam = Player.teams.through  # noqa: N806
+            PlayerTeam.objects.bulk_create(
+                [
+                    PlayerTeam(player_id=m.player.id, team_id=team_id)
+                    for m in members
+                    for team_id in m.team_ids
+                ]
+            )
+            bump_data_versions(DataVersion.NameChoices.PLAYERS)
+
+        for vaccination, path, username in certificates:
+            future = self.executor.submit(self.copy_certificate, vaccination, path)
+            self.copies.append((future, vaccination, username))
+
+        if members:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Data imported successfully for {len(members)} members "
+                    f"({len(certificates)} with media)."
                 )
-                player.full_clean()
-                player.save()
-                # Populate teams information to players
-                if uc_person:
-                    team_ids = UCRegistration.objects.filter(person_id=uc_person.id).values_list(
-                        "team_id", flat=True
-                    )
-                    for team_id in set(team_ids):
-                        player.teams.add(team_id)
-
-                # Create or get the Guardian instance if applicable
-                if minors:
-                    guardian_email = row[columns["guardian_email"]]
-                    guardian_name = row[columns["guardian_name"]]
-                    if not guardian_email:
-                        guardian_email = slugify(guardian_name)
-                    guardian_phone = clean_phone(row[columns["guardian_phone"]])
-                    first_name, last_name = ([*guardian_name.strip().split(), "", ""])[:2]
-                    guardian_user, created = User.objects.get_or_create(
-                        username=guardian_email.lower(),
-                        defaults={
-                            "email": guardian_email.lower(),
-                            "phone": guardian_phone,
-                            "first_name": first_name,
-                            "last_name": last_name,
-                        },
-                    )
-                    if not created:
-                        guardian_user.save()
-
-                    relation = row[columns["guardian_relation"]]
-                    guardian = Guardianship(
-                        user=guardian_user,
-                        relation=RELATIONS[relation],
-                        player=player,
+            )
+
+    def copy_certificate(self, vaccination: Vaccination, path: Path) -> str:
+        name = slugify(path.stem) + path.suffix
+        # NOTE: The storage copies the file in chunks, without reading it
+        # into memory. The vaccination is updated in bulk, after all copies.
+        with path.open("rb") as f:
+            vaccination.certificate.save(name, File(f), save=False)
+        return vaccination.certificate.name
+
+    def save_certificates(self) -> None:
+        wait([future for future, _, _ in self.copies])
+        copied = []
+        failed = []
+        for future, vaccination, username in self.copies:
+            if (error := future.exception()) is None:
+                copied.append(vaccination)
+            else:
+                failed.append(vaccination.id)
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"Failed to copy vaccination certificate: {username} ({error})"
                     )
-                    guardian.full_clean()
-                    guardian.save()
-
-                # Create the Membership instance
-                Membership.objects.create(
-                    player=player,
-                    is_annual=row[columns["membership_type"]] == "Full Member (INR 600/person)",
-                    start_date="2022-04-01",
-                    end_date="2023-03-31",
-                    is_active=False,
                 )
 
-                # Create the Vaccination instance
-                is_vaccinated = row[columns["is_vaccinated"]] == "Yes"
-                reason = row[columns["not_vaccinated_reason"]]
-                vaccination_name = row[columns["vaccination_name"]]
-
-                if minors:
-                    explanation = reason
-                else:
-                    explanation = row[columns["not_vaccinated_explanation"]]
-                    explanation = f"{reason}\n{explanation}".strip()
-                vaccination = Vaccination(
-                    player=player,
-                    is_vaccinated=is_vaccinated,
-                    name=VACCINATIONS.get(vaccination_name, None),
-                    explain_not_vaccinated=explanation,
-                )
-                vaccination.full_clean()
-                media_upload = False
-                if is_vaccinated:
-                    certificate_url = row[columns["certificate"]]
-                    cert_filename, content = self.find_vaccination_file(certificate_url, gdrive_map)
-                    if cert_filename and content:
-                        vaccination.save()
-                        vaccination.certificate.save(cert_filename, content)
-                        media_upload = True
-                    else:
-                        self.stdout.write(
-                            self.style.ERROR(
-                                f"Not saving vaccination info; missing certificate: {player.user.username}"
-                            )
-                        )
-                else:
-                    vaccination.save()
-
-                msg = (
-                    "Data imported successfully."
-                    if media_upload
-                    else "Data imported successfully (without media)."
-                )
-                self.stdout.write(self.style.SUCCESS(msg))
+        Vaccination.objects.bulk_update(copied, ["certificate"], batch_size=500)
+        # Vaccination info is not saved without a certificate
+        Vaccination.objects.filter(id__in=failed).delete()
+        bump_data_versions(DataVersion.NameChoices.PLAYERS)
+        self.stdout.write(
+            self.style.SUCCESS(f"Copied {len(copied)} of {len(self.copies)} certificates")
+        )
+        if failed:
+            self.stdout.write(self.style.ERROR(f"Failed to copy {len(failed)} certificates"))
 
-    def find_vaccination_file(
-        self, url: str | None, gdrive_map: dict[str, Path]
-    ) -> tuple[str | None, ContentFile[bytes] | None]:
+    def find_vaccination_file(self, url: str | None, gdrive_map: dict[str, Path]) -> Path | None:
         if not url:
-            return None, None
+            return None
         drive_id = url.split("=")[1]
-        if drive_id not in gdrive_map:
-            return drive_id, None
-        path = gdrive_map[drive_id]
-        with path.open("rb") as f:
-            name = slugify(path.stem) + path.suffix
-            return name, ContentFile(f.read())
+        path = gdrive_map.get(drive_id)
+        if path is None or not path.is_file():
+            return None
+        return path
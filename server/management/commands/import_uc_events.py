@@ -2,7 +2,7 @@ from typing import Any
 
 from django.core.management.base import BaseCommand, CommandParser
 
-from server.models import Event
+from server.models import DataVersion, Event, bump_data_versions
 from server.top_score_utils import TopScoreClient
 
 
@@ -52,6 +52,7 @@ class Command(BaseCommand):
             ],
             unique_fields=["ultimate_central_id"],
         )
+        bump_data_versions(DataVersion.NameChoices.EVENTS)
 
         style = self.style.SUCCESS if count > 0 else self.style.NOTICE
         self.stdout.write(style(f"Updated {len(events)} events"))
@@ -1,11 +1,26 @@
 import datetime
+import hashlib
+import json
 import os
-from typing import Any
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, cast
 
 from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+from django.db.models import DateField, ExpressionWrapper, F
 from django.utils.timezone import now
 
-from server.models import Event, Player, Team, UCPerson, UCRegistration
+from server.models import (
+    DataVersion,
+    Event,
+    Player,
+    Team,
+    UCPerson,
+    UCRegistration,
+    UCSyncState,
+    bump_data_versions,
+)
 from server.top_score_utils import TopScoreClient
 
 
@@ -13,6 +28,14 @@ def to_date(date: str) -> datetime.date:
     return datetime.datetime.strptime(date, "%Y-%m-%d").date()  # noqa: DTZ007
 
 
+def registrations_fingerprint(registrations: list[dict[str, Any]]) -> str:
+    data = sorted(
+        (r["id"], r["Person"]["id"], r["Team"] and r["Team"]["id"], r["roles"])
+        for r in registrations
+    )
+    return hashlib.sha256(json.dumps(data).encode("utf8")).hexdigest()
+
+
 class Command(BaseCommand):
     help = "Import registrations data from UC"
 
@@ -29,6 +52,24 @@ class Command(BaseCommand):
             type=to_date,
             help="Fetch registrations since specified date.",
         )
+        parser.add_argument(
+            "--workers",
+            default=1,
+            type=int,
+            help="Number of events to fetch registrations for concurrently.",
+        )
+        parser.add_argument(
+            "--incremental",
+            default=False,
+            action="store_true",
+            help="Skip events that ended and were synced after the grace period.",
+        )
+        parser.add_argument(
+            "--grace-days",
+            default=7,
+            type=int,
+            help="Number of days after an event ends to keep syncing its registrations.",
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
         since = options["since"]
@@ -47,129 +88,213 @@ class Command(BaseCommand):
             today = now().date()
             events = Event.objects.filter(start_date__gte=today)
 
+        events = events.filter(ultimate_central_id__isnull=False).select_related("uc_sync_state")
+        if options["incremental"]:
+            # Registrations of events that were synced after the grace period
+            # since they ended are not expected to change any more.
+            grace_end = ExpressionWrapper(
+                F("end_date") + datetime.timedelta(days=options["grace_days"]),
+                output_field=DateField(),
+            )
+            events = events.exclude(uc_sync_state__synced_at__date__gt=grace_end)
         n = events.count()
         self.stdout.write(self.style.WARNING(f"Fetching registrations for {n} events"))
 
         username = os.environ["TOPSCORE_USERNAME"]
         password = os.environ["TOPSCORE_PASSWORD"]
         client = TopScoreClient(username, password)
-        for event in events:
-            self.stdout.write(
-                self.style.WARNING(f"Fetching registrations for event: {event.title}")
+        # Fetch the access token once, before any concurrent requests are made
+        client.refresh_access_token()
+
+        # UC person ID, Team ID pairs, across all the events
+        self.person_teams: set[tuple[int, int]] = set()
+        # Sync states of events whose registrations changed, saved at the end
+        self.changed_sync_states: list[UCSyncState] = []
+
+        workers = options["workers"]
+        if workers > 1:
+            # NOTE: Registrations are fetched concurrently, but all the DB
+            # writes happen in this thread, one event at a time.
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self.fetch, client, event) for event in events]
+                for future in as_completed(futures):
+                    self.save(*future.result())
+        else:
+            for event in events:
+                self.save(*self.fetch(client, event))
+
+        # NOTE: The new fingerprints are saved only after the players' teams
+        # are added, so that events are synced again if the import fails.
+        # Cached registrations of the changed events are invalidated in the
+        # same transaction, by bumping their versions.
+        changed_event_ids = [sync_state.event_id for sync_state in self.changed_sync_states]
+        with transaction.atomic():
+            self.add_teams_to_players()
+            for sync_state in self.changed_sync_states:
+                sync_state.save()
+            UCSyncState.objects.filter(event_id__in=changed_event_ids).update(
+                version=F("version") + 1
             )
-            if event.ultimate_central_id is None:
-                continue
-            registrations = client.get_registrations(event.ultimate_central_id)
-            if registrations is None:
-                self.stdout.write(
-                    self.style.ERROR(f"Fetched no registrations for event: {event.title}")
-                )
-                continue
-            else:
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"Fetched {len(registrations)} registrations for {event.title}"
-                    )
-                )
+            if changed_event_ids:
+                bump_data_versions(DataVersion.NameChoices.TEAMS, DataVersion.NameChoices.PLAYERS)
+
+    def add_teams_to_players(self) -> None:
+        person_ids = {person_id for person_id, _ in self.person_teams}
+        uc_id_to_player_id = dict(
+            Player.objects.filter(ultimate_central_id__in=person_ids).values_list(
+                "ultimate_central_id", "id"
+            )
+        )
+        PlayerTeam = Player.teams.through  # noqa: N806
+        player_teams = [
+            PlayerTeam(player_id=uc_id_to_player_id[person_id], team_id=team_id)
+            for person_id, team_id in self.person_teams
+            if person_id in uc_id_to_player_id
+        ]
+        PlayerTeam.objects.bulk_create(player_teams, ignore_conflicts=True, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f"Added teams to {len(uc_id_to_player_id)} players"))
 
+    def fetch(
+        self, client: TopScoreClient, event: Event
+    ) -> tuple[Event, list[dict[str, Any]] | None]:
+        self.stdout.write(self.style.WARNING(f"Fetching registrations for event: {event.title}"))
+        start = time.monotonic()
+        registrations = client.get_registrations(cast(int, event.ultimate_central_id))
+        elapsed = time.monotonic() - start
+        if registrations is None:
             self.stdout.write(
-                self.style.WARNING(
-                    f"Creating persons, teams and registrations for event: {event.title}"
+                self.style.ERROR(
+                    f"Fetched no registrations for event: {event.title} ({elapsed:.2f}s)"
                 )
             )
-            persons_data = [registration["Person"] for registration in registrations]
-            persons_data_by_id = {person["id"]: person for person in persons_data}
-            persons = [
-                UCPerson(
-                    id=person["id"],
-                    email=person["email_canonical"],
-                    dominant_hand=person["dominant_hand"] or "",
-                    image_url=person["images"]["200"],
-                    first_name=person["first_name"],
-                    last_name=person["last_name"],
-                    slug=person["slug"],
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Fetched {len(registrations)} registrations for {event.title} ({elapsed:.2f}s)"
                 )
-                for person_id, person in persons_data_by_id.items()
-            ]
-            persons = UCPerson.objects.bulk_create(
-                persons,
-                update_conflicts=True,
-                update_fields=[
-                    "first_name",
-                    "last_name",
-                    "image_url",
-                    "email",
-                    "slug",
-                    "dominant_hand",
-                ],
-                unique_fields=["id"],
             )
+        return event, registrations
 
-            teams_data = [registration["Team"] for registration in registrations]
-            # NOTE: We ignore registrations without an associated team
-            teams_data = [t for t in teams_data if t is not None]
-            teams_data_by_id = {t["id"]: t for t in teams_data}
-            teams = [
-                Team(
-                    ultimate_central_id=team_id,
-                    ultimate_central_creator_id=team["creator_id"],
-                    ultimate_central_slug=team["slug"],
-                    facebook_url=team["facebook_url"],
-                    image_url=team["images"]["200"],
-                    name=team["name"],
-                )
-                for team_id, team in teams_data_by_id.items()
-            ]
-            teams = Team.objects.bulk_create(
-                teams,
-                update_conflicts=True,
-                update_fields=[
-                    "name",
-                    "image_url",
-                    "facebook_url",
-                    "ultimate_central_slug",
-                    "ultimate_central_creator_id",
-                ],
-                unique_fields=["ultimate_central_id"],
+    def save(self, event: Event, registrations: list[dict[str, Any]] | None) -> None:
+        if registrations is None:
+            return
+
+        fingerprint = registrations_fingerprint(registrations)
+        try:
+            sync_state = event.uc_sync_state
+        except UCSyncState.DoesNotExist:
+            sync_state = UCSyncState(event=event)
+        unchanged = (
+            sync_state.registrations_count == len(registrations)
+            and sync_state.fingerprint == fingerprint
+        )
+        sync_state.synced_at = now()
+        sync_state.registrations_count = len(registrations)
+        sync_state.fingerprint = fingerprint
+        if unchanged:
+            sync_state.save(update_fields=["synced_at"])
+            self.stdout.write(
+                self.style.NOTICE(f"Registrations unchanged for event: {event.title}")
             )
-            team_ids = {team.ultimate_central_id for team in teams}
-            uc_id_to_team_id = dict(
-                Team.objects.filter(ultimate_central_id__in=team_ids).values_list(
-                    "ultimate_central_id", "id"
-                )
+            return
+
+        start = time.monotonic()
+        self.stdout.write(
+            self.style.WARNING(
+                f"Creating persons, teams and registrations for event: {event.title}"
             )
+        )
+        persons_data = [registration["Person"] for registration in registrations]
+        persons_data_by_id = {person["id"]: person for person in persons_data}
+        persons = [
+            UCPerson(
+                id=person["id"],
+                email=person["email_canonical"],
+                dominant_hand=person["dominant_hand"] or "",
+                image_url=person["images"]["200"],
+                first_name=person["first_name"],
+                last_name=person["last_name"],
+                slug=person["slug"],
+            )
+            for person_id, person in persons_data_by_id.items()
+        ]
+        persons = UCPerson.objects.bulk_create(
+            persons,
+            update_conflicts=True,
+            update_fields=[
+                "first_name",
+                "last_name",
+                "image_url",
+                "email",
+                "slug",
+                "dominant_hand",
+            ],
+            unique_fields=["id"],
+        )
 
-            registration_objs = [
-                UCRegistration(
-                    id=registration["id"],
-                    event=event,
-                    team_id=uc_id_to_team_id[registration["Team"]["id"]],
-                    person_id=registration["Person"]["id"],
-                    roles=registration["roles"],
-                )
-                for registration in registrations
-                if registration["Team"] is not None
-            ]
-            UCRegistration.objects.bulk_create(
-                registration_objs,
-                update_conflicts=True,
-                update_fields=[
-                    "team_id",
-                    "roles",
-                ],
-                unique_fields=["id"],
+        teams_data = [registration["Team"] for registration in registrations]
+        # NOTE: We ignore registrations without an associated team
+        teams_data = [t for t in teams_data if t is not None]
+        teams_data_by_id = {t["id"]: t for t in teams_data}
+        teams = [
+            Team(
+                ultimate_central_id=team_id,
+                ultimate_central_creator_id=team["creator_id"],
+                ultimate_central_slug=team["slug"],
+                facebook_url=team["facebook_url"],
+                image_url=team["images"]["200"],
+                name=team["name"],
+            )
+            for team_id, team in teams_data_by_id.items()
+        ]
+        teams = Team.objects.bulk_create(
+            teams,
+            update_conflicts=True,
+            update_fields=[
+                "name",
+                "image_url",
+                "facebook_url",
+                "ultimate_central_slug",
+                "ultimate_central_creator_id",
+            ],
+            unique_fields=["ultimate_central_id"],
+        )
+        team_ids = {team.ultimate_central_id for team in teams}
+        uc_id_to_team_id = dict(
+            Team.objects.filter(ultimate_central_id__in=team_ids).values_list(
+                "ultimate_central_id", "id"
             )
+        )
 
-            # Add Team to registered Players
-            player_uc_ids_to_team_uc_ids = {
-                registration["person_id"]: registration["team_id"]
-                for registration in registrations
-                if registration["team_id"] is not None
-            }
-            players = Player.objects.filter(
-                ultimate_central_id__in=list(player_uc_ids_to_team_uc_ids.keys())
+        registration_objs = [
+            UCRegistration(
+                id=registration["id"],
+                event=event,
+                team_id=uc_id_to_team_id[registration["Team"]["id"]],
+                person_id=registration["Person"]["id"],
+                roles=registration["roles"],
             )
-            for player in players:
-                team_uc_id = player_uc_ids_to_team_uc_ids[player.ultimate_central_id]
-                team_id = uc_id_to_team_id[team_uc_id]
-                player.teams.add(team_id)
+            for registration in registrations
+            if registration["Team"] is not None
+        ]
+        UCRegistration.objects.bulk_create(
+            registration_objs,
+            update_conflicts=True,
+            update_fields=[
+                "team_id",
+                "roles",
+            ],
+            unique_fields=["id"],
+        )
+
+        # Collect teams of registered persons, to add them to Players at the end
+        self.person_teams.update(
+            (registration.person_id, registration.team_id) for registration in registration_objs
+        )
+
+        self.changed_sync_states.append(sync_state)
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Saved registrations for event: {event.title} ({elapsed:.2f}s)")
+        )
@@ -3,7 +3,7 @@ from typing import Any
 from django.core.management.base import BaseCommand
 from django.utils.timezone import now
 
-from server.models import Membership, Player
+from server.models import DataVersion, Membership, Player, bump_data_versions
 
 
 class Command(BaseCommand):
@@ -16,6 +16,7 @@ class Command(BaseCommand):
         if n > 0:
             stale_memberships.update(is_active=False, waiver_valid=False)
             Player.objects.filter(membership__in=stale_memberships).update(sponsored=False)
+            bump_data_versions(DataVersion.NameChoices.PLAYERS)
             self.stdout.write(self.style.SUCCESS(f"Invalidated {n} memberships"))
         else:
             self.stdout.write(self.style.NOTICE("No outdated memberships found"))
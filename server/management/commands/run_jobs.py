@@ -0,0 +1,74 @@
+import datetime
+import logging
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import close_old_connections
+
+from server.jobs import claim_next_job, fail_stale_jobs, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--once",
+            default=False,
+            action="store_true",
+            help="Exit after running all the queued jobs.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            default=5,
+            type=float,
+            help="Seconds to wait before checking for new jobs, when the queue is empty.",
+        )
+        parser.add_argument(
+            "--timeout",
+            default=60,
+            type=int,
+            help="Minutes after which jobs still running are considered stale, and failed.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        timeout = datetime.timedelta(minutes=options["timeout"])
+        while True:
+            # NOTE: Connections closed by the DB server, or older than
+            # CONN_MAX_AGE, are discarded and reopened by the next query.
+            close_old_connections()
+            try:
+                # Jobs left running by a previous worker that was stopped
+                for stale_job in fail_stale_jobs(timeout):
+                    self.stdout.write(self.style.ERROR(f"Failed stale job: {stale_job}"))
+                job = claim_next_job()
+            except Exception as e:
+                logger.exception("Failed to claim a job")
+                self.stdout.write(self.style.ERROR(f"Failed to claim a job: {e}"))
+                job = None
+
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(self.style.WARNING(f"Running job: {job}"))
+            start = time.monotonic()
+            try:
+                run_job(job)
+            except Exception as e:
+                # The job is failed as stale, once it times out
+                logger.exception("Failed to run job %s", job)
+                self.stdout.write(self.style.ERROR(f"Failed to run job {job}: {e}"))
+                continue
+            elapsed = time.monotonic() - start
+            style = (
+                self.style.SUCCESS
+                if job.status == job.StatusChoices.SUCCEEDED
+                else self.style.ERROR
+            )
+            self.stdout.write(style(f"Job {job} {job.status} ({elapsed:.2f}s)"))
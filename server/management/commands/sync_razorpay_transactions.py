@@ -1,45 +1,102 @@
-import itertools
+import datetime
 from typing import Any
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils.timezone import now
 
 from server.api import mark_transaction_completed
-from server.models import RazorpayTransaction
+from server.models import RazorpaySyncState, RazorpayTransaction
 from server.utils import get_transactions
 
-STATUSES = {s.value: s for s in RazorpayTransaction.TransactionStatusChoices}
+Status = RazorpayTransaction.TransactionStatusChoices
+
+# Razorpay payment statuses, in increasing order of precedence, when an
+# order has multiple payments. Other statuses don't change the order status.
+PAYMENT_STATUSES = {
+    "failed": Status.FAILED,
+    "captured": Status.COMPLETED,
+    "refunded": Status.REFUNDED,
+}
+PRECEDENCE = list(PAYMENT_STATUSES.values())
 
 
 class Command(BaseCommand):
-    help = "Import Razorpay transactions from the last week"
+    help = "Import Razorpay transactions created since the last sync"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--days",
+            default=None,
+            type=int,
+            help="Sync payments from the last n days, instead of those since the last sync.",
+        )
+        parser.add_argument(
+            "--overlap-minutes",
+            default=60,
+            type=int,
+            help="Re-fetch payments created these many minutes before the last synced payment.",
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
-        transactions = get_transactions()
-        transactions_by_status = itertools.groupby(transactions, key=lambda x: x["status"])
-
-        for status_, ts in transactions_by_status:
-            status_value = "completed" if status_ == "captured" else status_
-            status = STATUSES[status_value]
-            order_ids = {t["order_id"] for t in ts}
-            qs = (
-                RazorpayTransaction.objects.filter(order_id__in=order_ids).exclude(status=status)
-                # .order_by("payment_date") NOTE: This is actually order
-                # date. We could sort transactions based on transactions data,
-                # though, if required
+        sync_state = RazorpaySyncState.objects.first()
+        until = now()
+        if options["days"] is not None:
+            since = until - datetime.timedelta(days=options["days"])
+        elif sync_state is not None:
+            # NOTE: Recent payments are re-fetched, since their status may
+            # have changed (from authorized to captured, for instance).
+            since = sync_state.last_payment_at - datetime.timedelta(
+                minutes=options["overlap_minutes"]
+            )
+        else:
+            since = None
+
+        order_statuses: dict[str, Status] = {}
+        last_payment_at: datetime.datetime | None = None
+        n_payments = 0
+        for payment in get_transactions(since, until):
+            n_payments += 1
+            created_at = datetime.datetime.fromtimestamp(
+                payment["created_at"], tz=datetime.timezone.utc
             )
+            last_payment_at = max(created_at, last_payment_at or created_at)
+            status = PAYMENT_STATUSES.get(payment["status"])
+            order_id = payment["order_id"]
+            if status is None:
+                continue
+            current = order_statuses.get(order_id)
+            if current is None or PRECEDENCE.index(status) > PRECEDENCE.index(current):
+                order_statuses[order_id] = status
 
-            if status == RazorpayTransaction.TransactionStatusChoices.COMPLETED:
-                n = qs.count()
-                for transaction in qs:
+        self.stdout.write(self.style.NOTICE(f"Fetched {n_payments} payments since {since}"))
+
+        orders_by_status: dict[Status, set[str]] = {}
+        for order_id, status in order_statuses.items():
+            orders_by_status.setdefault(status, set()).add(order_id)
+
+        for status, order_ids in orders_by_status.items():
+            qs = RazorpayTransaction.objects.filter(order_id__in=order_ids).exclude(status=status)
+            if status == Status.COMPLETED:
+                n = 0
+                for transaction in qs.prefetch_related("players"):
                     mark_transaction_completed(transaction)
+                    n += 1
             else:
+                if status == Status.FAILED:
+                    # Failed payments don't change orders that were paid for
+                    qs = qs.filter(status=Status.PENDING)
                 # NOTE: Not sure if we need to do any additional actions for
                 # other statuses like refunded, for instance. May be we deal
-                # with it manually for now. If the transactions are being
-                # processed oldest first, may be we can set the memberships to
-                # inactive based on this status?
+                # with it manually for now.
                 n = qs.update(status=status)
 
             self.stdout.write(
-                self.style.SUCCESS(f"Updated status of {n} transactions to {status_value}.")
+                self.style.SUCCESS(f"Updated status of {n} transactions to {status.value}.")
             )
+
+        if last_payment_at is not None:
+            if sync_state is None:
+                sync_state = RazorpaySyncState(last_payment_at=last_payment_at)
+            sync_state.last_payment_at = max(sync_state.last_payment_at, last_payment_at)
+            sync_state.synced_at = until
+            sync_state.save()
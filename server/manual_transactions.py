@@ -1,52 +1,82 @@
 import csv
-from io import StringIO
+import gzip
+import io
+import itertools
+from collections.abc import Callable, Iterator
 from pathlib import Path
-from typing import Any
+from typing import IO, TextIO, cast
 
+from server.constants import BANK_STATEMENT_CHUNK_SIZE
 from server.models import ManualTransaction
 
 
-def read_bank_statement(bank_statement: Path | StringIO) -> dict[str, Any]:
-    data = {}
-    with open(bank_statement) if isinstance(bank_statement, Path) else bank_statement as csvfile:
-        # Skip empty lines at the beginning of the file
-        seek = 0
-        while True:
-            line = csvfile.readline()
-            if line.strip():
-                break
-            else:
-                seek += len(line) + 1
+def open_bank_statement(file: IO[bytes], name: str) -> TextIO:
+    # NOTE: The statement is decoded incrementally, while it is being read,
+    # instead of decoding the whole file into memory.
+    if name.endswith(".gz"):
+        file = cast(IO[bytes], gzip.GzipFile(fileobj=file))
+    return io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
 
-        csvfile.seek(seek)
+def read_bank_statement(bank_statement: Path | TextIO) -> Iterator[tuple[str, float]]:
+    # NOTE: Yields the (reference number, credit amount) for each row,
+    # without reading the whole statement into memory.
+    if isinstance(bank_statement, Path):
+        bank_statement = open_bank_statement(bank_statement.open("rb"), bank_statement.name)
 
-        reader = csv.DictReader(csvfile, skipinitialspace=True)
+    with bank_statement as csvfile:
+        # Skip empty lines at the beginning of the file
+        lines = itertools.dropwhile(lambda line: not line.strip(), csvfile)
+        reader = csv.DictReader(lines, skipinitialspace=True)
         for row_ in reader:
             row = {key.strip(): val.strip() for key, val in row_.items()}
             reference_number = row["Chq/Ref Number"].lstrip(
                 "0"
             )  # FIXME: Should we strip the DC chars on the right?
             credit_amount = float(row["Credit Amount"])
-            data[reference_number] = credit_amount
+            yield reference_number, credit_amount
 
-    return data
 
+def validate_manual_transactions(
+    bank_statement: Path | TextIO,
+    chunk_size: int = BANK_STATEMENT_CHUNK_SIZE,
+    on_progress: Callable[[int], None] | None = None,
+) -> dict[str, int]:
+    rows = read_bank_statement(bank_statement)
+    references: set[str] = set()
+    found: set[str] = set()
+    validated = n_rows = 0
 
-def validate_manual_transactions(bank_statement: Path | StringIO) -> dict[str, int]:
-    bank_statement_data = read_bank_statement(bank_statement)
-    total = len(bank_statement_data)
-    validated = invalid_found = 0
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        # NOTE: Only the transactions referred to in a chunk of the statement
+        # are fetched, and the matching ones are validated in a single UPDATE.
+        # Transaction IDs are compared without their leading zeros
+        # A reference may appear on several rows, with different amounts
+        amounts: dict[str, set[float]] = {}
+        for reference_number, credit_amount in chunk:
+            amounts.setdefault(reference_number, set()).add(credit_amount)
+        references.update(amounts)
+        transactions = ManualTransaction.objects.filter(
+            normalized_transaction_id__in=amounts, validated=False
+        )
 
-    for transaction in ManualTransaction.objects.filter(validated=False):
-        tid = transaction.transaction_id.lstrip("0")
+        matched = []
+        for tid, normalized_tid, amount in transactions.values_list(
+            "transaction_id", "normalized_transaction_id", "amount"
+        ):
+            # NOTE: Transactions matched in an earlier chunk are already
+            # validated, but unmatched ones are compared with the amounts of
+            # every chunk that mentions them.
+            found.add(tid)
+            bank_amounts = amounts[normalized_tid]  # Amounts in rupees (float)
+            if any(bank_amount * 100 == amount for bank_amount in bank_amounts):  # In paise
+                matched.append(tid)
 
-        if tid in bank_statement_data:
-            invalid_found += 1
-            bank_amount = bank_statement_data[tid]  # Amount in rupees (float)
-            user_amount = transaction.amount  # Amount in paise
-            if bank_amount * 100 == user_amount:
-                transaction.validated = True
-                transaction.save(update_fields=["validated"])
-                validated += 1
+        validated += ManualTransaction.objects.filter(transaction_id__in=matched).update(
+            validated=True
+        )
+        n_rows += len(chunk)
+        if on_progress is not None:
+            on_progress(n_rows)
 
-    return {"total": total, "invalid_found": invalid_found, "validated": validated}
+    return {"total": len(references), "invalid_found": len(found), "validated": validated}
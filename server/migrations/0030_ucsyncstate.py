@@ -0,0 +1,35 @@
+# Generated by Django 4.2.2 on 2026-10-18 01:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("server", "0029_manualtransaction_validation_comment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UCSyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("synced_at", models.DateTimeField()),
+                ("registrations_count", models.PositiveIntegerField(default=0)),
+                ("fingerprint", models.CharField(max_length=64)),
+                (
+                    "event",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="uc_sync_state",
+                        to="server.event",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.2 on 2026-10-18 01:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import server.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("server", "0030_ucsyncstate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("validate_transactions", "Validate Transactions"),
+                            ("import_members_data", "Import Members Data"),
+                            ("sync_razorpay_transactions", "Sync Razorpay Transactions"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("succeeded", "Succeeded"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("params", models.JSONField(blank=True, default=dict)),
+                (
+                    "input_file",
+                    models.FileField(blank=True, upload_to=server.models.upload_job_files),
+                ),
+                ("progress", models.PositiveIntegerField(default=0)),
+                ("result", models.JSONField(blank=True, null=True)),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"], name="server_job_status_b44e75_idx"
+                    )
+                ],
+            },
+        ),
+    ]
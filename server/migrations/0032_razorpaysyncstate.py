@@ -0,0 +1,25 @@
+# Generated by Django 4.2.2 on 2026-10-18 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("server", "0031_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RazorpaySyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("last_payment_at", models.DateTimeField()),
+                ("synced_at", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.2 on 2026-10-18 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("server", "0032_razorpaysyncstate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RazorpayWebhookEvent",
+            fields=[
+                ("event_id", models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+                ("processed", models.BooleanField(default=False)),
+                ("duplicates", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("server", "0033_razorpaywebhookevent"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="manualtransaction",
+            index=models.Index(
+                fields=["user", "payment_date"], name="server_manu_user_id_ce15b5_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 01:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("server", "0034_manualtransaction_user_payment_date_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ucsyncstate",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
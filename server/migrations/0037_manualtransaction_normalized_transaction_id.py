@@ -0,0 +1,28 @@
+# Generated by Django 4.2.2 on 2026-10-18 02:18
+
+from typing import Any
+
+from django.db import migrations, models
+from django.db.models import F, Func, Value
+
+
+def normalize_transaction_ids(apps: Any, schema_editor: Any) -> None:
+    ManualTransaction = apps.get_model("server", "ManualTransaction")  # noqa: N806
+    ManualTransaction.objects.update(
+        normalized_transaction_id=Func(F("transaction_id"), Value("0"), function="LTRIM")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("server", "0036_dataversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="manualtransaction",
+            name="normalized_transaction_id",
+            field=models.CharField(db_index=True, default="", editable=False, max_length=255),
+        ),
+        migrations.RunPython(normalize_transaction_ids, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,8 @@ from typing import Any
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils.crypto import get_random_string
 from django.utils.timezone import now
@@ -147,6 +148,10 @@ class UCPerson(models.Model):
     slug = models.SlugField(db_index=True)
     image_url = models.URLField(null=True, blank=True)
 
+    # NOTE: Not a field; set when the players of many persons are looked up
+    # in bulk by their ultimate_central_id (see with_registration_players)
+    player: "Player | None"
+
 
 class UCRegistration(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
@@ -155,6 +160,17 @@ class UCRegistration(models.Model):
     roles = models.JSONField()
 
 
+class UCSyncState(models.Model):
+    # NOTE: Tracks the last sync of registrations for an event from UC, to
+    # skip saving registrations that haven't changed since the last sync.
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name="uc_sync_state")
+    synced_at = models.DateTimeField()
+    registrations_count = models.PositiveIntegerField(default=0)
+    fingerprint = models.CharField(max_length=64)
+    # Incremented whenever the registrations change, to invalidate caches
+    version = models.PositiveIntegerField(default=0)
+
+
 class Membership(models.Model):
     player = models.OneToOneField(Player, on_delete=models.CASCADE)
     membership_number = models.CharField(max_length=20, unique=True)
@@ -173,8 +189,7 @@ def create_transaction_from_order_data(cls: Any, data: dict[str, Any]) -> Any:
     attrs_data = {key: value for key, value in data.items() if key in fields}
     transaction = cls.objects.create(**attrs_data)
     players = data.get("players", [])
-    for player in players:
-        transaction.players.add(player)
+    transaction.players.add(*players)
     return transaction
 
 
@@ -214,8 +229,28 @@ class RazorpayTransaction(models.Model):
         return create_transaction_from_order_data(cls, data)
 
 
+class RazorpayWebhookEvent(models.Model):
+    # NOTE: Razorpay delivers webhooks at least once; events are recorded by
+    # their id to skip processing duplicate deliveries.
+    event_id = models.CharField(primary_key=True, max_length=255)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed = models.BooleanField(default=False)
+    duplicates = models.PositiveIntegerField(default=0)
+
+
+class RazorpaySyncState(models.Model):
+    # NOTE: Tracks the creation time of the latest payment synced from
+    # Razorpay, so that the next sync only fetches newer payments.
+    last_payment_at = models.DateTimeField()
+    synced_at = models.DateTimeField()
+
+
 class ManualTransaction(models.Model):
     transaction_id = models.CharField(primary_key=True, max_length=255)
+    # Transaction ID without leading zeros, to match the bank statements
+    normalized_transaction_id = models.CharField(
+        max_length=255, db_index=True, default="", editable=False
+    )
     amount = models.IntegerField()
     currency = models.CharField(max_length=5)
     payment_date = models.DateTimeField(auto_now_add=True)
@@ -225,6 +260,9 @@ class ManualTransaction(models.Model):
     validated = models.BooleanField(default=False)
     validation_comment = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "payment_date"])]
+
     def __str__(self) -> str:
         return self.transaction_id
 
@@ -261,6 +299,68 @@ class Vaccination(models.Model):
     explain_not_vaccinated = models.TextField(blank=True, null=True)
 
 
+def upload_job_files(instance: "Job", filename: str) -> str:
+    parent = Path("jobs")
+    path = Path(filename)
+    new_name = f"{path.stem}-{get_random_string(12)}{''.join(path.suffixes)}"
+    return str(parent / new_name)
+
+
+class Job(models.Model):
+    # NOTE: Long running operations are queued as jobs, and run by the
+    # run_jobs management command, outside of the web server processes.
+    class KindChoices(models.TextChoices):
+        VALIDATE_TRANSACTIONS = "validate_transactions", _("Validate Transactions")
+        IMPORT_MEMBERS_DATA = "import_members_data", _("Import Members Data")
+        SYNC_RAZORPAY_TRANSACTIONS = "sync_razorpay_transactions", _("Sync Razorpay Transactions")
+
+    class StatusChoices(models.TextChoices):
+        QUEUED = "queued", _("Queued")
+        RUNNING = "running", _("Running")
+        SUCCEEDED = "succeeded", _("Succeeded")
+        FAILED = "failed", _("Failed")
+
+    kind = models.CharField(max_length=50, choices=KindChoices.choices)
+    status = models.CharField(
+        max_length=20, choices=StatusChoices.choices, default=StatusChoices.QUEUED
+    )
+    params = models.JSONField(default=dict, blank=True)
+    input_file = models.FileField(upload_to=upload_job_files, blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.kind} ({self.id})"
+
+
+class DataVersion(models.Model):
+    # NOTE: Incremented whenever the data returned by a read-heavy list
+    # endpoint changes, to compute its ETag without reading the data.
+    class NameChoices(models.TextChoices):
+        EVENTS = "events", _("Events")
+        TEAMS = "teams", _("Teams")
+        PLAYERS = "players", _("Players")
+
+    name = models.CharField(max_length=20, choices=NameChoices.choices, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+
+
+def bump_data_versions(*names: str) -> None:
+    bumped = DataVersion.objects.filter(name__in=names).update(version=F("version") + 1)
+    if bumped < len(names):
+        DataVersion.objects.bulk_create(
+            [DataVersion(name=name, version=1) for name in names], ignore_conflicts=True
+        )
+
+
 @receiver(pre_save, sender=Membership)
 def create_membership_number(sender: Any, instance: Membership, raw: bool, **kwargs: Any) -> None:
     if raw or instance.membership_number:
@@ -268,3 +368,48 @@ def create_membership_number(sender: Any, instance: Membership, raw: bool, **kwa
 
     instance.membership_number = str(uuid.uuid4())[:8]
     return
+
+
+@receiver(pre_save, sender=ManualTransaction)
+def normalize_transaction_id(
+    sender: Any, instance: ManualTransaction, raw: bool, **kwargs: Any
+) -> None:
+    instance.normalized_transaction_id = instance.transaction_id.lstrip("0")
+
+
+# NOTE: Bulk creates and queryset updates don't send these signals, and need
+# to call bump_data_versions explicitly.
+@receiver([post_save, post_delete], sender=Event)
+def bump_events_version(sender: Any, raw: bool = False, **kwargs: Any) -> None:
+    if not raw:
+        bump_data_versions(DataVersion.NameChoices.EVENTS)
+
+
+@receiver([post_save, post_delete], sender=Team)
+def bump_teams_version(sender: Any, raw: bool = False, **kwargs: Any) -> None:
+    # Players are listed along with their teams
+    if not raw:
+        bump_data_versions(DataVersion.NameChoices.TEAMS, DataVersion.NameChoices.PLAYERS)
+
+
+@receiver([post_save, post_delete], sender=Player)
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Guardianship)
+@receiver([post_save, post_delete], sender=Membership)
+@receiver([post_save, post_delete], sender=Vaccination)
+def bump_players_version(
+    sender: Any,
+    raw: bool = False,
+    update_fields: frozenset[str] | None = None,
+    **kwargs: Any,
+) -> None:
+    # Logins only update the last_login of users, which isn't listed
+    if raw or update_fields == frozenset({"last_login"}):
+        return
+    bump_data_versions(DataVersion.NameChoices.PLAYERS)
+
+
+@receiver(m2m_changed, sender=Player.teams.through)
+def bump_players_version_on_teams_change(sender: Any, action: str, **kwargs: Any) -> None:
+    if action in {"post_add", "post_remove", "post_clear"}:
+        bump_data_versions(DataVersion.NameChoices.PLAYERS)
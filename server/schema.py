@@ -1,10 +1,12 @@
 from typing import Any
 
+from django.db.models import Prefetch, QuerySet
 from ninja import ModelSchema, Schema
 
 from server.models import (
     Event,
     Guardianship,
+    Job,
     ManualTransaction,
     Membership,
     Player,
@@ -49,12 +51,6 @@ class Response(Schema):
     message: str
 
 
-class ValidationStatsSchema(Schema):
-    total: int
-    invalid_found: int
-    validated: int
-
-
 class MembershipSchema(ModelSchema):
     waiver_signed_by: str | None
 
@@ -134,6 +130,17 @@ class TransactionSchema(ModelSchema):
         model_fields = "__all__"
 
 
+def with_transaction_relations(
+    transactions: QuerySet[ManualTransaction],
+) -> QuerySet[ManualTransaction]:
+    # NOTE: Loads all the data used by TransactionSchema, in a fixed number of
+    # queries irrespective of the number of transactions and players.
+    players = Player.objects.select_related("user")
+    return transactions.select_related("user", "event").prefetch_related(
+        Prefetch("players", queryset=players)
+    )
+
+
 class ManualTransactionValidationFormSchema(Schema):
     transaction_id: str
     validation_comment: str
@@ -145,6 +152,27 @@ class ManualTransactionSchema(ModelSchema):
         model_fields = ["transaction_id", "amount", "currency"]
 
 
+class JobSchema(ModelSchema):
+    class Config:
+        model = Job
+        model_fields = [
+            "id",
+            "kind",
+            "status",
+            "progress",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+
+class ImportMembersJobFormSchema(Schema):
+    minors: bool = False
+    dry_run: bool = False
+
+
 class OrderSchema(Schema):
     order_id: str
     amount: int
@@ -223,8 +251,7 @@ class PlayerSchema(ModelSchema):
     @staticmethod
     def resolve_guardian(player: Player) -> int | None:
         try:
-            guardianship = Guardianship.objects.get(player=player)
-            return guardianship.user.id
+            return player.guardianship.user_id
         except Guardianship.DoesNotExist:
             return None
 
@@ -281,11 +308,39 @@ class PlayerTinySchema(ModelSchema):
         ]
 
 
+def with_player_relations(players: QuerySet[Player], full_schema: bool = True) -> QuerySet[Player]:
+    # NOTE: Load all the related objects used by the resolvers of PlayerSchema
+    # (or PlayerTinySchema) upfront, to serialize any number of players with a
+    # constant number of queries.
+    players = players.select_related("user", "membership").prefetch_related("teams")
+    if full_schema:
+        players = players.select_related(
+            "membership__waiver_signed_by", "vaccination", "guardianship"
+        )
+    return players
+
+
+def with_registration_players(
+    registrations: QuerySet[UCRegistration],
+) -> list[UCRegistration]:
+    # NOTE: Players of all the registered persons are looked up with a single
+    # query, instead of one query per registration in PersonSchema.
+    registrations_ = list(registrations.select_related("team", "person"))
+    person_ids = {registration.person_id for registration in registrations_}
+    players = with_player_relations(Player.objects.filter(ultimate_central_id__in=person_ids))
+    players_by_uc_id = {player.ultimate_central_id: player for player in players}
+    for registration in registrations_:
+        registration.person.player = players_by_uc_id.get(registration.person_id)
+    return registrations_
+
+
 class PersonSchema(ModelSchema):
     player: PlayerSchema | None
 
     @staticmethod
     def resolve_player(person: UCPerson) -> Player | None:
+        if hasattr(person, "player"):
+            return person.player
         try:
             return Player.objects.get(ultimate_central_id=person.id)
         except Player.DoesNotExist:
@@ -331,7 +386,7 @@ class UserSchema(ModelSchema):
 
     @staticmethod
     def resolve_wards(user: User) -> list[PlayerSchema]:
-        wards = Player.objects.filter(guardianship__user=user)
+        wards = with_player_relations(Player.objects.filter(guardianship__user=user))
         return [PlayerSchema.from_orm(p) for p in wards]
 
     class Config:
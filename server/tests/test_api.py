@@ -1,11 +1,17 @@
 import datetime
+import gzip
 import json
+import tempfile
 import uuid
+from io import StringIO
 from pathlib import Path
+from typing import Any
 from unittest import mock
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client
+from django.core.management import call_command
+from django.test import Client, override_settings
 from django.test.client import MULTIPART_CONTENT
 from django.utils.timezone import now
 
@@ -17,11 +23,18 @@ from server.constants import (
 from server.models import (
     Event,
     Guardianship,
+    Job,
     ManualTransaction,
     Membership,
     Player,
     RazorpayTransaction,
+    RazorpayWebhookEvent,
+    Team,
+    UCPerson,
+    UCRegistration,
+    UCSyncState,
     User,
+    Vaccination,
 )
 from server.tests.base import ApiBaseTestCase, fake_id, fake_order
 
@@ -326,6 +339,287 @@ class TestPlayers(ApiBaseTestCase):
         self.assertNotIn("membership", user_data)
         self.assertNotIn("guardian", user_data)
 
+    def test_get_players_num_queries(self) -> None:
+        c = self.client
+        self.user.is_staff = True
+        self.user.save()
+        team = Team.objects.create(name="Team")
+        n_players = 20
+        for i in range(n_players):
+            user = User.objects.create(username=f"user-{i}")
+            player = Player.objects.create(user=user, date_of_birth="2010-01-01")
+            player.teams.add(team)
+            Membership.objects.create(
+                player=player,
+                start_date="2023-06-01",
+                end_date="2024-05-31",
+                waiver_signed_by=self.user,
+            )
+            Vaccination.objects.create(player=player, is_vaccinated=False)
+            Guardianship.objects.create(user=self.user, player=player, relation="MO")
+
+        # session + user + data version + players + teams
+        with self.assertNumQueries(5):
+            response = c.get("/api/players?full_schema=1", content_type="application/json")
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(n_players + 1, len(data))
+        player_data = data[-1]
+        self.assertEqual(self.user.id, player_data["guardian"])
+        self.assertEqual(self.user.get_full_name(), player_data["membership"]["waiver_signed_by"])
+        self.assertFalse(player_data["vaccination"]["is_vaccinated"])
+        self.assertEqual([team.id], [t["id"] for t in player_data["teams"]])
+
+        with self.assertNumQueries(5):
+            response = c.get("/api/players", content_type="application/json")
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(n_players + 1, len(data))
+        self.assertFalse(data[-1]["has_membership"])
+
+    def test_get_players_streaming(self) -> None:
+        c = self.client
+        self.user.is_staff = True
+        self.user.save()
+        for i in range(5):
+            user = User.objects.create(username=f"user-{i}")
+            Player.objects.create(user=user, date_of_birth="2001-01-01")
+
+        for query in ["", "full_schema=1"]:
+            response = c.get(f"/api/players?{query}", content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            expected = response.json()
+
+            response = c.get(f"/api/players?{query}&stream=1", content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            self.assertTrue(response.streaming)
+            self.assertEqual(str(len(expected)), response["X-Total-Count"])
+            data = json.loads(response.getvalue())
+            self.assertEqual(expected, data)
+
+    def test_get_players_paginated(self) -> None:
+        c = self.client
+        n_players = 10
+        for i in range(n_players):
+            user = User.objects.create(username=f"user-{i}", first_name=f"Player{i}")
+            Player.objects.create(user=user, date_of_birth="2001-01-01")
+        player_ids = sorted(Player.objects.values_list("id", flat=True))
+
+        ids: list[int] = []
+        url = "/api/players?limit=4"
+        while True:
+            response = c.get(url, content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(str(n_players + 1), response["X-Total-Count"])
+            ids.extend(p["id"] for p in response.json())
+            after = response.headers.get("X-Next-Cursor")
+            if after is None:
+                break
+            url = f"/api/players?limit=4&after={after}"
+        self.assertEqual(player_ids, ids)
+
+    def test_get_players_filters(self) -> None:
+        c = self.client
+        team = Team.objects.create(name="Team")
+        minor_dob = str(now().date())
+        states = ["KA", "KA", "KA", "TN", "TN", "TN"]
+        for i, state_ut in enumerate(states):
+            user = User.objects.create(username=f"user-{i}", first_name=f"Player{i}")
+            player = Player.objects.create(
+                user=user,
+                date_of_birth="2001-01-01" if i % 2 == 0 else minor_dob,
+                state_ut=state_ut,
+                city="Bengaluru" if state_ut == "KA" else "Chennai",
+                sponsored=i == 0,
+            )
+            if i in {0, 1}:
+                player.teams.add(team)
+                Membership.objects.create(
+                    player=player, start_date="2023-06-01", end_date="2024-05-31", is_active=True
+                )
+
+        def count(query: str) -> int:
+            response = c.get(f"/api/players?{query}", content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            return len(response.json())
+
+        self.assertEqual(3, count("state_ut=KA"))
+        self.assertEqual(2, count(f"team_id={team.id}"))
+        self.assertEqual(2, count("has_membership=1"))
+        self.assertEqual(5, count("has_membership=0"))
+        self.assertEqual(1, count("sponsored=1"))
+        self.assertEqual(3, count("is_minor=1"))
+        self.assertEqual(4, count("is_minor=0"))
+        self.assertEqual(1, count("q=player3"))
+        self.assertEqual(3, count("q=chennai"))
+        self.assertEqual(1, count("q=chennai+player4"))
+        self.assertEqual(1, count("state_ut=TN&is_minor=0"))
+
+    def test_get_players_etag(self) -> None:
+        c = self.client
+        for i in range(5):
+            user = User.objects.create(username=f"user-{i}")
+            Player.objects.create(user=user, date_of_birth="2001-01-01")
+
+        response = c.get("/api/players")
+        self.assertEqual(200, response.status_code)
+        etag = response["ETag"]
+
+        # Unchanged players are not fetched again
+        with self.assertNumQueries(3):
+            response = c.get("/api/players", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response["ETag"])
+        self.assertEqual(b"", response.content)
+
+        # Players may turn adults on another day
+        tomorrow = now() + datetime.timedelta(days=1)
+        with mock.patch("server.api.now", return_value=tomorrow):
+            response = c.get("/api/players", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+
+        # ETags depend on the query parameters
+        response = c.get("/api/players?state_ut=KA", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        response = c.get("/api/players?stream=1")
+        self.assertTrue(response.streaming)
+        response = c.get("/api/players?stream=1", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(304, response.status_code)
+
+        # And change when the players (or related data) change
+        Membership.objects.create(
+            player=self.player, start_date="2023-06-01", end_date="2024-05-31", is_active=True
+        )
+        response = c.get("/api/players", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+        etag = response["ETag"]
+
+        # Including changes made by management commands
+        Membership.objects.filter(player=self.player).update(end_date="2023-05-31")
+        call_command("invalidate_memberships", stdout=StringIO())
+        response = c.get("/api/players", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+
+    def test_get_teams_and_events_etag(self) -> None:
+        c = self.client
+        Team.objects.create(name="Team")
+        Event.objects.create(title="Event", start_date="2023-06-01", end_date="2023-06-02")
+
+        for url in ["/api/teams", "/api/events?include_all=1"]:
+            response = c.get(url)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(1, len(response.json()))
+            etag = response["ETag"]
+
+            with self.assertNumQueries(3):
+                response = c.get(url, HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+            self.assertEqual(304, response.status_code)
+
+        response = c.get("/api/events", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([], response.json())
+
+        # Logins don't change the players listed
+        player_etag = c.get("/api/players")["ETag"]
+        self.client.force_login(self.user)
+        self.assertEqual(player_etag, c.get("/api/players")["ETag"])
+
+        Team.objects.create(name="Another Team")
+        response = c.get("/api/teams", HTTP_IF_NONE_MATCH=c.get("/api/teams")["ETag"])
+        self.assertEqual(304, response.status_code)
+        self.assertNotEqual(player_etag, c.get("/api/players")["ETag"])
+
+
+class TestRegistrations(ApiBaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.user)
+        self.event = Event.objects.create(
+            ultimate_central_id=1, title="Event", start_date="2023-06-01", end_date="2023-06-02"
+        )
+        self.teams = [
+            Team.objects.create(ultimate_central_id=i, name=f"Team {i}") for i in range(2)
+        ]
+        for i in range(40):
+            person = UCPerson.objects.create(id=i + 1, slug=f"person-{i}")
+            UCRegistration.objects.create(
+                id=i + 1, event=self.event, team=self.teams[i % 2], person=person, roles=[]
+            )
+            # Only some of the registered persons have a player profile
+            if i % 3 == 0:
+                user = User.objects.create(username=f"user-{i}", first_name=f"User {i}")
+                Player.objects.create(
+                    user=user, date_of_birth="2001-01-01", ultimate_central_id=person.id
+                )
+
+    def test_list_registrations(self) -> None:
+        c = self.client
+        response = c.get(f"/api/registrations/{self.event.id}")
+        self.assertEqual(400, response.status_code)
+
+        self.user.is_staff = True
+        self.user.save()
+        # Session, user, event, data versions, registrations, players and their teams
+        with self.assertNumQueries(7):
+            response = c.get(f"/api/registrations/{self.event.id}")
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(40, len(data))
+        players = {r["person"]["id"]: r["person"]["player"] for r in data}
+        self.assertEqual(14, len([p for p in players.values() if p is not None]))
+        self.assertEqual("User 3", players[4]["full_name"])
+        self.assertIsNone(players[2])
+
+        # Repeated views are served from the cache
+        with self.assertNumQueries(4):
+            response = c.get(f"/api/registrations/{self.event.id}")
+        self.assertEqual(data, response.json())
+        etag = response["ETag"]
+        response = c.get(f"/api/registrations/{self.event.id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        # Until the registrations are imported again
+        UCRegistration.objects.filter(id=1).delete()
+        response = c.get(f"/api/registrations/{self.event.id}")
+        self.assertEqual(40, len(response.json()))
+        UCSyncState.objects.create(event=self.event, synced_at=now(), fingerprint="", version=1)
+        response = c.get(f"/api/registrations/{self.event.id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(39, len(response.json()))
+
+        # Or the players' data changes
+        etag = response["ETag"]
+        player = Player.objects.get(ultimate_central_id=4)
+        Membership.objects.create(
+            player=player, start_date="2023-06-01", end_date="2024-05-31", is_active=True
+        )
+        response = c.get(f"/api/registrations/{self.event.id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        players = {r["person"]["id"]: r["person"]["player"] for r in response.json()}
+        self.assertTrue(players[4]["membership"]["is_active"])
+
+        # Players only see the registrations of their teams
+        self.user.is_staff = False
+        self.user.save()
+        self.player.ultimate_central_id = 2
+        self.player.save()
+        response = c.get(f"/api/registrations/{self.event.id}")
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(20, len(data))
+        self.assertEqual({self.teams[1].id}, {r["team"]["id"] for r in data})
+
+        # Players not registered for the event see no registrations
+        self.player.ultimate_central_id = 100
+        self.player.save()
+        response = c.get(f"/api/registrations/{self.event.id}")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([], response.json())
+        response = c.get(f"/api/registrations/{self.event.id}", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(304, response.status_code)
+
 
 class TestPayment(ApiBaseTestCase):
     def setUp(self) -> None:
@@ -620,19 +914,24 @@ class TestPayment(ApiBaseTestCase):
 
     def test_create_order_group_membership(self) -> None:
         c = self.client
-        player_ids = [200, 220, 230, 225]
+        player_ids = list(range(200, 300))
 
         for id_ in player_ids:
             username = str(uuid.uuid4())[:8]
             user = User.objects.create(username=username)
             date_of_birth = "2001-01-01"
             player = Player.objects.create(id=id_, user=user, date_of_birth=date_of_birth)
+        # Existing memberships are left as they are until the payment succeeds
+        membership = Membership.objects.create(
+            player=player, start_date="2022-06-01", end_date="2023-05-31"
+        )
 
         amount = ANNUAL_MEMBERSHIP_AMOUNT * len(player_ids)
+        # The number of queries doesn't depend on the number of players
         with mock.patch(
             "server.api.create_razorpay_order",
             return_value=fake_order(amount),
-        ) as f:
+        ) as f, self.assertNumQueries(7):
             response = c.post(
                 "/api/create-order",
                 data={
@@ -651,9 +950,10 @@ class TestPayment(ApiBaseTestCase):
         self.assertEqual(self.user, transaction.user)
         self.assertIsNotNone(transaction.start_date)
         self.assertIsNotNone(transaction.end_date)
-        for player_id in player_ids:
+        self.assertEqual(set(player_ids), {p.id for p in transaction.players.all()})
+        self.assertEqual(membership, Membership.objects.get(player_id=player_ids[-1]))
+        for player_id in player_ids[:-1]:
             player = Player.objects.get(id=player_id)
-            self.assertIn(player, transaction.players.all())
             self.assertEqual(player.membership.start_date, transaction.start_date)
             self.assertEqual(player.membership.end_date, transaction.end_date)
             self.assertTrue(player.membership.is_annual)
@@ -749,9 +1049,63 @@ class TestPayment(ApiBaseTestCase):
         self.assertEqual(start_date, membership.start_date.strftime("%Y-%m-%d"))
         self.assertEqual(end_date, membership.end_date.strftime("%Y-%m-%d"))
 
+    def test_payment_webhook_duplicates(self) -> None:
+        c = self.client
+        order = fake_order(60000)
+        order_id = order["order_id"]
+        order.update(
+            {
+                "start_date": "2023-06-01",
+                "end_date": "2024-05-31",
+                "user": self.user,
+                "players": [self.player],
+            }
+        )
+        RazorpayTransaction.create_from_order_data(order)
+        payment_id = f"pay_{fake_id(16)}"
+        body = {"payload": {"payment": {"entity": {"id": payment_id, "order_id": order_id}}}}
+
+        def post_webhook(event_id: str) -> str:
+            with mock.patch("server.api.verify_razorpay_webhook_payload", return_value=True):
+                response = c.post(
+                    "/api/payment-success-webhook",
+                    data=body,
+                    content_type="application/json",
+                    HTTP_X_RAZORPAY_EVENT_ID=event_id,
+                )
+            self.assertEqual(200, response.status_code)
+            message: str = response.json()["message"]
+            return message
+
+        self.assertEqual("Webhook processed", post_webhook("evt_1"))
+        membership = Membership.objects.get(player=self.player)
+        self.assertTrue(membership.is_active)
+
+        # Duplicate deliveries only look up the event (besides the session)
+        with self.assertNumQueries(3):
+            self.assertEqual("Webhook already processed", post_webhook("evt_1"))
+        self.assertEqual(1, RazorpayWebhookEvent.objects.get(event_id="evt_1").duplicates)
+
+        # Other confirmations of a completed transaction don't update memberships
+        with mock.patch("server.api.Membership.objects.bulk_create") as bulk_create:
+            self.assertEqual("Webhook processed", post_webhook("evt_2"))
+            with mock.patch("server.api.verify_razorpay_payment", return_value=True):
+                response = c.post(
+                    "/api/payment-success",
+                    data={
+                        "razorpay_order_id": order_id,
+                        "razorpay_payment_id": payment_id,
+                        "razorpay_signature": "signature",
+                    },
+                    content_type="application/json",
+                )
+            self.assertEqual(200, response.status_code)
+        bulk_create.assert_not_called()
+        self.assertEqual(2, RazorpayWebhookEvent.objects.filter(processed=True).count())
+
     def test_payment_success_group_membership(self) -> None:
         c = self.client
-        n_players = 4
+        n_players = 25
         amount = 60000 * n_players
         order = fake_order(amount)
         order_id = order["order_id"]
@@ -777,7 +1131,10 @@ class TestPayment(ApiBaseTestCase):
 
         payment_id = f"pay_{fake_id(16)}"
         signature = f"{fake_id(64)}"
-        with mock.patch("server.api.verify_razorpay_payment", return_value=True):
+        # The number of queries doesn't depend on the number of players
+        with mock.patch(
+            "server.api.verify_razorpay_payment", return_value=True
+        ), self.assertNumQueries(11):
             response = c.post(
                 "/api/payment-success",
                 data={
@@ -911,21 +1268,81 @@ class TestPayment(ApiBaseTestCase):
         ManualTransaction.create_from_order_data(order)
         orders.add(order["order_id"])
 
+        # Create transaction made by current user for their player and ward
+        order = fake_order(ANNUAL_MEMBERSHIP_AMOUNT * 2)
+        order.update(user=self.user, players=players[:2], transaction_id=order["order_id"])
+        ManualTransaction.create_from_order_data(order)
+        orders.add(order["order_id"])
+
         # Create transaction made by another user
         order = fake_order(ANNUAL_MEMBERSHIP_AMOUNT * 2)
         order.update(user=users[2], players=players[2:], transaction_id=order["order_id"])
         ManualTransaction.create_from_order_data(order)
 
-        response = c.get(
-            "/api/transactions",
-            content_type="application/json",
-        )
+        # Session, user, transactions with users and events, players with users
+        with self.assertNumQueries(4):
+            response = c.get(
+                "/api/transactions",
+                content_type="application/json",
+            )
         self.assertEqual(200, response.status_code)
         response_data = response.json()
 
         self.assertEqual(len(orders), len(response_data))
         self.assertEqual(orders, {t["transaction_id"] for t in response_data})
 
+        response = c.get("/api/transactions?stream=1", content_type="application/json")
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
+        data = json.loads(response.getvalue())
+        self.assertEqual(response_data, data)
+
+    def test_list_transactions_num_queries(self) -> None:
+        c = self.client
+        self.user.is_staff = True
+        self.user.save()
+
+        players = [self.player]
+        for i in range(2):
+            user_ = User.objects.create(username=f"user-{i}", first_name=f"User {i}")
+            players.append(Player.objects.create(user=user_, date_of_birth="2001-01-01"))
+        event = Event.objects.create(title="Event", start_date="2023-06-01", end_date="2023-06-02")
+
+        n = 1000
+        transactions = ManualTransaction.objects.bulk_create(
+            [
+                ManualTransaction(
+                    transaction_id=f"txn-{i}",
+                    amount=ANNUAL_MEMBERSHIP_AMOUNT,
+                    user=self.user,
+                    event=event if i % 2 else None,
+                )
+                for i in range(n)
+            ]
+        )
+        TransactionPlayer = ManualTransaction.players.through  # noqa: N806
+        TransactionPlayer.objects.bulk_create(
+            [
+                TransactionPlayer(manualtransaction_id=t.transaction_id, player_id=player.id)
+                for t in transactions
+                for player in players[1:]
+            ]
+        )
+
+        # Session, user, transactions with users and events, players with users
+        with self.assertNumQueries(4):
+            response = c.get("/api/transactions?include_all=1")
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(n, len(data))
+        self.assertEqual(["User 0", "User 1"], sorted(data[0]["players"]))
+
+        # One query for players for each chunk of transactions streamed
+        with self.assertNumQueries(5):
+            response = c.get("/api/transactions?include_all=1&stream=1")
+            streamed = json.loads(response.getvalue())
+        self.assertEqual(data, streamed)
+
     def test_razorpay_failures(self) -> None:
         player = self.player
         c = self.client
@@ -1055,6 +1472,16 @@ class TestValidateTransactions(ApiBaseTestCase):
     def setUp(self) -> None:
         super().setUp()
         self.client.force_login(self.user)
+        # Uploaded files are saved to a temporary directory
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        media_root = override_settings(MEDIA_ROOT=tmp_dir.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        # NOTE: Don't let the jobs worker close the test's DB connection
+        patcher = mock.patch("server.management.commands.run_jobs.close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
         self.fixtures_dir = Path(__file__).parent.joinpath("fixtures")
         self.fixture = self.fixtures_dir / "bank-statement.csv"
         transactions = {
@@ -1064,24 +1491,85 @@ class TestValidateTransactions(ApiBaseTestCase):
         for tid, amount in transactions.items():
             ManualTransaction.objects.create(transaction_id=tid, amount=amount, user=self.user)
 
-    def test_validate_transactions(self) -> None:
-        c = self.client
-
-        with open(self.fixture, "rb") as f:
-            content = f.read()
-
-        bank_statement = SimpleUploadedFile(
-            self.fixture.name, content, content_type="application/csv"
-        )
-        response = c.post(
+    def validate_transactions(self, name: str, content: bytes) -> dict[str, Any]:
+        bank_statement = SimpleUploadedFile(name, content, content_type="application/csv")
+        response = self.client.post(
             path="/api/validate-transactions",
             data={"bank_statement": bank_statement},
             content_type=MULTIPART_CONTENT,
         )
         self.assertEqual(200, response.status_code)
-        stats = response.json()
+        job = response.json()
+        self.assertEqual("queued", job["status"])
+
+        call_command("run_jobs", "--once", stdout=StringIO())
+
+        response = self.client.get(f"/api/jobs/{job['id']}")
+        self.assertEqual(200, response.status_code)
+        data: dict[str, Any] = response.json()
+        return data
+
+    def test_validate_transactions(self) -> None:
+        with open(self.fixture, "rb") as f:
+            content = f.read()
+
+        job = self.validate_transactions(self.fixture.name, content)
+        self.assertEqual("succeeded", job["status"])
+        self.assertEqual(4, job["progress"])
+        stats = job["result"]
         self.assertEqual(4, stats["total"])
         self.assertEqual(2, stats["invalid_found"])
         self.assertEqual(1, stats["validated"])
         self.assertEqual(1, ManualTransaction.objects.filter(validated=False).count())
         self.assertFalse(ManualTransaction.objects.get(transaction_id="33680091811DC").validated)
+
+        response = self.client.post(
+            path="/api/validate-transactions",
+            data={"bank_statement": SimpleUploadedFile("statement.txt", content)},
+            content_type=MULTIPART_CONTENT,
+        )
+        self.assertEqual(400, response.status_code)
+
+    def test_validate_transactions_gzip(self) -> None:
+        with open(self.fixture, "rb") as f:
+            content = gzip.compress(f.read())
+
+        job = self.validate_transactions("statement.csv.gz", b"not gzip")
+        self.assertEqual("failed", job["status"])
+        self.assertIn("BadGzipFile", job["error"])
+
+        job = self.validate_transactions("statement.csv.gz", content)
+        self.assertEqual("succeeded", job["status"])
+        self.assertEqual({"total": 4, "invalid_found": 2, "validated": 1}, job["result"])
+
+    def test_get_job(self) -> None:
+        job = Job.objects.create(kind=Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS)
+        response = self.client.get(f"/api/jobs/{job.id}")
+        self.assertEqual(404, response.status_code)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(f"/api/jobs/{job.id}")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("queued", response.json()["status"])
+
+    def test_staff_jobs(self) -> None:
+        response = self.client.post("/api/jobs/sync-razorpay-transactions")
+        self.assertEqual(403, response.status_code)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post("/api/jobs/sync-razorpay-transactions")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("sync_razorpay_transactions", response.json()["kind"])
+
+        members_data = SimpleUploadedFile("members.csv", b"")
+        response = self.client.post(
+            "/api/jobs/import-members-data",
+            data={"members_data": members_data, "dry_run": True},
+            content_type=MULTIPART_CONTENT,
+        )
+        self.assertEqual(200, response.status_code)
+        job = Job.objects.get(id=response.json()["id"])
+        self.assertEqual({"minors": False, "dry_run": True}, job.params)
+        self.assertTrue(job.input_file.name.startswith("jobs/members-"))
@@ -0,0 +1,86 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory
+
+from server.firebase_middleware import FirebaseAuthenticationMiddleware, token_cache_stats
+from server.tests.base import ApiBaseTestCase
+
+
+class TestFirebaseMiddleware(ApiBaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        token_cache_stats.clear()
+        self.middleware = FirebaseAuthenticationMiddleware(lambda request: HttpResponse())
+
+    def make_request(self, token: str, path: str = "/api/me") -> HttpRequest:
+        request = RequestFactory().get(path)
+        request.session = {"firebase_token": token}  # type: ignore[assignment]
+        return request
+
+    def test_verified_token_is_cached(self) -> None:
+        decoded = {"uid": "uid", "exp": time.time() + 3600}
+        with mock.patch("firebase_admin.auth.verify_id_token", return_value=decoded), mock.patch(
+            "firebase_admin.auth.get_user", return_value=mock.MagicMock(email=self.username)
+        ) as get_user:
+            for _ in range(3):
+                request = self.make_request("token")
+                self.middleware(request)
+                self.assertEqual(self.user, request.user)
+
+        get_user.assert_called_once_with("uid")
+        self.assertEqual(2, token_cache_stats["hits"])
+        self.assertEqual(1, token_cache_stats["misses"])
+
+    def test_expired_token_is_not_cached(self) -> None:
+        decoded = {"uid": "uid", "exp": time.time() - 1}
+        with mock.patch("firebase_admin.auth.verify_id_token", return_value=decoded), mock.patch(
+            "firebase_admin.auth.get_user", return_value=mock.MagicMock(email=self.username)
+        ) as get_user:
+            for _ in range(2):
+                request = self.make_request("token")
+                self.middleware(request)
+                self.assertEqual(self.user, request.user)
+
+        self.assertEqual(2, get_user.call_count)
+        self.assertEqual(0, token_cache_stats["hits"])
+
+    def test_invalid_token(self) -> None:
+        with mock.patch("firebase_admin.auth.verify_id_token", side_effect=ValueError):
+            request = self.make_request("token")
+            request.user = mock.sentinel.anonymous
+            self.middleware(request)
+        self.assertEqual(mock.sentinel.anonymous, request.user)
+        self.assertEqual(1, token_cache_stats["misses"])
+
+    def test_recently_verified_session_user(self) -> None:
+        decoded = {"uid": "uid", "exp": time.time() + 3600}
+        with mock.patch(
+            "firebase_admin.auth.verify_id_token", return_value=decoded
+        ) as verify_id_token, mock.patch(
+            "firebase_admin.auth.get_user", return_value=mock.MagicMock(email=self.username)
+        ):
+            request = self.make_request("token")
+            self.middleware(request)
+            self.assertIn("firebase_token_verified_at", request.session)
+
+            # Session authenticated user, with the token verified recently
+            session = request.session
+            request = self.make_request("token")
+            request.session = session
+            request.user = self.user
+            self.middleware(request)
+
+        verify_id_token.assert_called_once()
+        self.assertEqual(1, token_cache_stats["misses"])
+        self.assertEqual(0, token_cache_stats["hits"])
+
+    def test_skipped_paths(self) -> None:
+        with mock.patch("firebase_admin.auth.verify_id_token") as verify_id_token:
+            for path in ["/admin/", "/static/main.css", "/"]:
+                self.middleware(self.make_request("token", path))
+        verify_id_token.assert_not_called()
+        self.assertEqual(0, sum(token_cache_stats.values()))
@@ -1,12 +1,38 @@
 import csv
+import datetime
+import os
+import tempfile
+from io import StringIO
 from pathlib import Path
+from typing import Any
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
 from django.core.management import CommandError, call_command
-from django.test import TestCase
+from django.db import OperationalError
+from django.test import TestCase, override_settings
 from django.utils.timezone import now
 
-from server.models import Membership, Player, UCPerson
+from server.jobs import claim_next_job, enqueue_job
+from server.management.commands.import_members_data import Command as ImportMembersData
+from server.management.commands.import_uc_registrations import (
+    Command as ImportUCRegistrations,
+)
+from server.models import (
+    DataVersion,
+    Event,
+    Job,
+    Membership,
+    Player,
+    RazorpayTransaction,
+    Team,
+    UCPerson,
+    UCRegistration,
+    UCSyncState,
+    Vaccination,
+)
 
 User = get_user_model()
 
@@ -35,6 +61,465 @@ class TestImportData(TestCase):
         self.assertEqual(User.objects.count(), n - 1)
         self.assertEqual(Player.objects.count(), n - 1)
 
+    def test_import_members_data_chunks(self) -> None:
+        adults_csv = self.fixtures_dir.joinpath("form-data.csv")
+        with adults_csv.open() as f:
+            n = len(list(csv.DictReader(f)))
+
+        person = UCPerson.objects.get(slug="kannan")
+        team = Team.objects.create(ultimate_central_id=1, name="Team")
+        event = Event.objects.create(
+            ultimate_central_id=1, start_date="2023-01-01", end_date="2023-01-02"
+        )
+        UCRegistration.objects.create(id=1, event=event, team=team, person=person, roles=[])
+
+        out = StringIO()
+        call_command("import_members_data", adults_csv, "--chunk-size=2", stdout=out)
+        self.assertIn(f"Imported {n - 1} of {n} rows", out.getvalue())
+        self.assertEqual(Player.objects.count(), n - 1)
+        self.assertEqual(Membership.objects.count(), n - 1)
+        self.assertEqual(Membership.objects.filter(membership_number="").count(), 0)
+        player = Player.objects.get(ultimate_central_id=person.id)
+        self.assertEqual([team.id], list(player.teams.values_list("id", flat=True)))
+
+        # Importing the data again doesn't create any new users
+        out = StringIO()
+        call_command("import_members_data", adults_csv, stdout=out)
+        self.assertIn(f"Imported 0 of {n} rows", out.getvalue())
+        self.assertEqual(User.objects.count(), n - 1)
+
+    def test_import_members_data_conflicts(self) -> None:
+        adults_csv = self.fixtures_dir.joinpath("form-data.csv")
+        load_lookups = ImportMembersData.load_lookups
+
+        def load_lookups_and_link(command: ImportMembersData) -> None:
+            load_lookups(command)
+            # A user signs up, and another links their UC profile meanwhile
+            User.objects.create(username="benchmark@gmail.com")
+            user = User.objects.create(username="someone@example.com")
+            person = UCPerson.objects.get(slug="kannan")
+            Player.objects.create(
+                user=user, date_of_birth="2000-01-01", ultimate_central_id=person.id
+            )
+
+        out = StringIO()
+        with mock.patch.object(ImportMembersData, "load_lookups", load_lookups_and_link):
+            call_command("import_members_data", adults_csv, "--chunk-size=2", stdout=out)
+        output = out.getvalue()
+        self.assertIn("User created during import: benchmark@gmail.com", output)
+        self.assertIn("UC profile linked to another player during import", output)
+        self.assertIn("Imported 6 of 9 rows", output)
+        self.assertEqual(7, Player.objects.count())
+
+    def test_import_members_data_dry_run(self) -> None:
+        with self.fixtures_dir.joinpath("form-data.csv").open() as f:
+            reader = csv.DictReader(f)
+            fieldnames = list(reader.fieldnames or [])
+            rows = list(reader)
+        rows[0]["Date of Birth "] = "31-31-2000"
+        rows[1]["Gender"] = "Unknown"
+        rows[2]["Personal Email ID"] = rows[3]["Personal Email ID"]
+        profile = "Please add the link (URL) to your www.indiaultimate.org Profile here"
+        rows[7][profile] = rows[6][profile]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = Path(tmp_dir) / "data.csv"
+            with csv_file.open("w") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+
+            report = Path(tmp_dir) / "report.csv"
+            # Only the lookups are loaded from the DB
+            with self.assertNumQueries(4):
+                call_command(
+                    "import_members_data",
+                    csv_file,
+                    "--dry-run",
+                    f"--report={report}",
+                    stdout=StringIO(),
+                )
+            self.assertEqual(0, User.objects.count())
+
+            with report.open() as f:
+                issues = {
+                    (int(issue["row"]), issue["level"], issue["column"])
+                    for issue in csv.DictReader(f)
+                }
+            self.assertIn((1, "error", "Date of Birth"), issues)
+            self.assertIn((2, "warning", "Gender"), issues)
+            self.assertIn((4, "info", "Personal Email ID"), issues)
+            self.assertIn((6, "error", "Personal Email ID"), issues)
+            self.assertIn((8, "error", profile), issues)
+
+            # The real import skips the rows with errors, and imports the rest
+            out = StringIO()
+            call_command("import_members_data", csv_file, stdout=out)
+            self.assertIn("Imported 5 of 9 rows", out.getvalue())
+            self.assertEqual(1, Player.objects.filter(ultimate_central_id__isnull=False).count())
+
+            with self.assertRaisesRegex(CommandError, "should be a .csv or a .json"):
+                call_command("import_members_data", csv_file, "--dry-run", "--report=report.txt")
+
+    def test_import_members_data_certificates(self) -> None:
+        adults_csv = self.fixtures_dir.joinpath("form-data.csv")
+        drive_ids = [
+            "15Ybs6dQiRxPbKUoyPyYmdQClF",
+            "1F8LKQ6XSlGYuudNZ4_Iw6Q8k",
+            "0TSbWeN71S2V2gj_iYvD",
+        ]
+        save = FileSystemStorage.save
+
+        def flaky_save(storage: FileSystemStorage, name: str, *args: Any, **kwargs: Any) -> str:
+            if "cert-2" in name:
+                raise OSError("Disk full")
+            return save(storage, name, *args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            download_path = Path(tmp_dir)
+            gdrive_map_csv = download_path / "map.csv"
+            with gdrive_map_csv.open("w") as f:
+                writer = csv.writer(f)
+                writer.writerow(["File ID", "File Path"])
+                for i, drive_id in enumerate(drive_ids):
+                    download_path.joinpath(f"cert-{i}.pdf").write_bytes(b"%PDF" * 1000)
+                    writer.writerow([drive_id, f"cert-{i}.pdf"])
+
+            out = StringIO()
+            with override_settings(MEDIA_ROOT=download_path / "media"), mock.patch.object(
+                FileSystemStorage, "save", flaky_save
+            ):
+                call_command(
+                    "import_members_data",
+                    adults_csv,
+                    f"--gdrive-map-csv={gdrive_map_csv}",
+                    f"--download-path={download_path}",
+                    "--workers=2",
+                    stdout=out,
+                )
+
+            output = out.getvalue()
+            self.assertIn("Copied 2 of 3 certificates", output)
+            self.assertIn("Failed to copy vaccination certificate: arr@gmail.com", output)
+            certificates = Vaccination.objects.exclude(certificate="").values_list(
+                "certificate", flat=True
+            )
+            self.assertEqual(2, len(certificates))
+            for name in certificates:
+                self.assertEqual(4000, download_path.joinpath("media", name).stat().st_size)
+            # Vaccination info isn't saved for missing or failed certificates,
+            # but is saved for a user who didn't upload one
+            self.assertEqual(3, Vaccination.objects.count())
+
+
+def fake_registration(reg_id: int, person_id: int, team_id: int) -> dict[str, Any]:
+    return {
+        "id": reg_id,
+        "person_id": person_id,
+        "team_id": team_id,
+        "roles": ["player"],
+        "Person": {
+            "id": person_id,
+            "email_canonical": f"person-{person_id}@example.com",
+            "dominant_hand": None,
+            "images": {"200": "https://example.com/person.png"},
+            "first_name": "Person",
+            "last_name": str(person_id),
+            "slug": f"person-{person_id}",
+        },
+        "Team": {
+            "id": team_id,
+            "creator_id": 1,
+            "slug": f"team-{team_id}",
+            "facebook_url": None,
+            "images": {"200": "https://example.com/team.png"},
+            "name": f"Team {team_id}",
+        },
+    }
+
+
+@mock.patch.dict(os.environ, {"TOPSCORE_USERNAME": "username", "TOPSCORE_PASSWORD": "password"})
+@mock.patch("server.top_score_utils.TopScoreClient.refresh_access_token")
+class TestImportUCRegistrations(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        # Event UC id -> registrations (UC ids of registration, person, team)
+        self.registrations = {
+            100: [(1, 11, 21), (2, 12, 21), (3, 13, 22)],
+            101: [(4, 11, 23), (5, 14, 23)],
+            102: [(6, 15, 24)],
+        }
+        today = now().date()
+        for uc_id in self.registrations:
+            Event.objects.create(
+                title=f"Event {uc_id}",
+                start_date=today,
+                end_date=today + datetime.timedelta(days=2),
+                ultimate_central_id=uc_id,
+            )
+        user = User.objects.create(username="player")
+        self.player = Player.objects.create(
+            user=user, date_of_birth="2001-01-01", ultimate_central_id=11
+        )
+
+    def get_registrations(self, event_id: int, *args: Any, **kwargs: Any) -> list[dict[str, Any]]:
+        return [fake_registration(*r) for r in self.registrations[event_id]]
+
+    def import_registrations(self, *args: str) -> str:
+        out = StringIO()
+        with mock.patch(
+            "server.top_score_utils.TopScoreClient.get_registrations",
+            side_effect=self.get_registrations,
+        ) as get_registrations:
+            call_command("import_uc_registrations", *args, stdout=out)
+        self.fetched = {call.args[0] for call in get_registrations.call_args_list}
+        return out.getvalue()
+
+    def test_import_uc_registrations(self, _: mock.MagicMock) -> None:
+        for workers in [1, 3]:
+            UCSyncState.objects.all().delete()
+            output = self.import_registrations("--all", f"--workers={workers}")
+            self.assertEqual(6, UCRegistration.objects.count())
+            self.assertEqual(5, UCPerson.objects.count())
+            self.assertEqual(4, Team.objects.count())
+            self.assertEqual(
+                {21, 23}, set(self.player.teams.values_list("ultimate_central_id", flat=True))
+            )
+            self.assertIn("Saved registrations for event: Event 101", output)
+
+    def test_import_uc_registrations_unchanged(self, _: mock.MagicMock) -> None:
+        self.import_registrations("--all")
+        self.assertEqual(3, UCSyncState.objects.count())
+
+        self.registrations[101].append((7, 16, 23))
+        output = self.import_registrations("--all")
+        self.assertIn("Registrations unchanged for event: Event 100", output)
+        self.assertIn("Saved registrations for event: Event 101", output)
+        self.assertEqual(7, UCRegistration.objects.count())
+        self.assertEqual(
+            3, UCSyncState.objects.get(event__ultimate_central_id=101).registrations_count
+        )
+        # Only the version of the changed event is bumped
+        versions = dict(UCSyncState.objects.values_list("event__ultimate_central_id", "version"))
+        self.assertEqual({100: 1, 101: 2, 102: 1}, versions)
+
+    def test_import_uc_registrations_failed(self, _: mock.MagicMock) -> None:
+        data_versions = list(DataVersion.objects.values_list("name", "version"))
+        # The import fails after some of the events were saved
+        with mock.patch.object(
+            ImportUCRegistrations, "add_teams_to_players", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            self.import_registrations("--all")
+        self.assertEqual(0, self.player.teams.count())
+        self.assertEqual(0, UCSyncState.objects.count())
+        self.assertEqual(data_versions, list(DataVersion.objects.values_list("name", "version")))
+
+        # And the events are saved again by the next import
+        output = self.import_registrations("--all")
+        self.assertNotIn("Registrations unchanged", output)
+        self.assertEqual(
+            {21, 23}, set(self.player.teams.values_list("ultimate_central_id", flat=True))
+        )
+        self.assertEqual({1}, set(UCSyncState.objects.values_list("version", flat=True)))
+
+    def test_import_uc_registrations_incremental(self, _: mock.MagicMock) -> None:
+        self.import_registrations("--all", "--incremental")
+        self.assertEqual({100, 101, 102}, self.fetched)
+
+        # Event 100 ended long ago, and was synced after the grace period
+        Event.objects.filter(ultimate_central_id=100).update(end_date="2020-01-01")
+        self.import_registrations("--all", "--incremental")
+        self.assertEqual({101, 102}, self.fetched)
+
+        # Even when the last sync is older than the grace period
+        last_sync = now() - datetime.timedelta(days=30)
+        UCSyncState.objects.filter(event__ultimate_central_id=100).update(synced_at=last_sync)
+        self.import_registrations("--all", "--incremental")
+        self.assertEqual({101, 102}, self.fetched)
+
+        # But not when the last sync happened before the grace period ended
+        UCSyncState.objects.filter(event__ultimate_central_id=100).update(
+            synced_at=datetime.datetime(2020, 1, 5, tzinfo=datetime.timezone.utc)
+        )
+        self.import_registrations("--all", "--incremental")
+        self.assertEqual({100, 101, 102}, self.fetched)
+
+        # Event 101 ended recently, and is synced until the grace period ends
+        yesterday = now().date() - datetime.timedelta(days=1)
+        Event.objects.filter(ultimate_central_id=101).update(end_date=yesterday)
+        self.import_registrations("--all", "--incremental", "--grace-days=3")
+        self.assertEqual({101, 102}, self.fetched)
+
+        self.import_registrations("--all")
+        self.assertEqual({100, 101, 102}, self.fetched)
+
+
+class TestRunJobs(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        # NOTE: Like Django's test client, don't let the worker close the
+        # connection that holds the test's transaction.
+        patcher = mock.patch("server.management.commands.run_jobs.close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run_jobs(self) -> None:
+        jobs = [
+            Job.objects.create(kind=Job.KindChoices.IMPORT_MEMBERS_DATA, params={"dry_run": True}),
+            Job.objects.create(kind=Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS),
+        ]
+        with mock.patch.dict(
+            "server.jobs.JOB_HANDLERS",
+            {
+                Job.KindChoices.IMPORT_MEMBERS_DATA: lambda job: {"params": job.params},
+                Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS: mock.Mock(side_effect=ValueError),
+            },
+        ):
+            out = StringIO()
+            call_command("run_jobs", "--once", stdout=out)
+
+        first, second = (Job.objects.get(id=job.id) for job in jobs)
+        self.assertEqual(Job.StatusChoices.SUCCEEDED, first.status)
+        self.assertEqual({"params": {"dry_run": True}}, first.result)
+        self.assertEqual(Job.StatusChoices.FAILED, second.status)
+        self.assertIn("ValueError", second.error)
+        self.assertIsNotNone(second.finished_at)
+        self.assertLess(out.getvalue().index(str(first)), out.getvalue().index(str(second)))
+
+        # Claimed jobs are not run again
+        self.assertIsNone(claim_next_job())
+
+    def test_run_jobs_db_errors(self) -> None:
+        job = Job.objects.create(kind=Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS)
+        out = StringIO()
+        # The worker keeps running when claiming a job fails, say, because the
+        # connection to the DB was lost
+        with mock.patch(
+            "server.management.commands.run_jobs.claim_next_job",
+            side_effect=[OperationalError("connection lost"), claim_next_job(), KeyboardInterrupt],
+        ), mock.patch("server.management.commands.run_jobs.time.sleep"), mock.patch.dict(
+            "server.jobs.JOB_HANDLERS", {Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS: lambda job: {}}
+        ), self.assertLogs(
+            "server.management.commands.run_jobs"
+        ), self.assertRaises(
+            KeyboardInterrupt
+        ):
+            call_command("run_jobs", stdout=out)
+
+        self.assertIn("Failed to claim a job: connection lost", out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual(Job.StatusChoices.SUCCEEDED, job.status)
+
+    def test_run_jobs_stale(self) -> None:
+        started_at = now() - datetime.timedelta(hours=2)
+        stale = Job.objects.create(
+            kind=Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS,
+            status=Job.StatusChoices.RUNNING,
+            started_at=started_at,
+        )
+        running = Job.objects.create(
+            kind=Job.KindChoices.SYNC_RAZORPAY_TRANSACTIONS,
+            status=Job.StatusChoices.RUNNING,
+            started_at=now(),
+        )
+        out = StringIO()
+        call_command("run_jobs", "--once", "--timeout=60", stdout=out)
+        self.assertIn(f"Failed stale job: {stale}", out.getvalue())
+
+        stale.refresh_from_db()
+        self.assertEqual(Job.StatusChoices.FAILED, stale.status)
+        self.assertIn("did not finish", stale.error)
+        running.refresh_from_db()
+        self.assertEqual(Job.StatusChoices.RUNNING, running.status)
+
+    def test_run_jobs_deletes_input_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(MEDIA_ROOT=tmp_dir):
+            job = enqueue_job(
+                Job.KindChoices.IMPORT_MEMBERS_DATA,
+                input_file=ContentFile(b"", name="members.csv"),
+            )
+            path = Path(job.input_file.path)
+            self.assertTrue(path.exists())
+            with mock.patch.dict(
+                "server.jobs.JOB_HANDLERS", {Job.KindChoices.IMPORT_MEMBERS_DATA: lambda job: {}}
+            ):
+                call_command("run_jobs", "--once", stdout=StringIO())
+
+            job.refresh_from_db()
+            self.assertEqual(Job.StatusChoices.SUCCEEDED, job.status)
+            self.assertFalse(job.input_file)
+            self.assertFalse(path.exists())
+
+
+def fake_payment(order_id: str, status: str, created_at: datetime.datetime) -> dict[str, Any]:
+    return {"order_id": order_id, "status": status, "created_at": int(created_at.timestamp())}
+
+
+class TestSyncRazorpayTransactions(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        user = User.objects.create(username="user@example.com")
+        self.player = Player.objects.create(user=user, date_of_birth="1990-01-01")
+        for i in range(4):
+            transaction = RazorpayTransaction.objects.create(
+                order_id=f"order_{i}", amount=65000, user=user
+            )
+            transaction.players.add(self.player)
+        RazorpayTransaction.objects.filter(order_id="order_3").update(
+            status=RazorpayTransaction.TransactionStatusChoices.COMPLETED
+        )
+
+    def sync(self, payments: list[dict[str, Any]], *args: str) -> list[dict[str, Any]]:
+        # NOTE: Razorpay returns pages of upto 100 payments
+        pages = [payments[i : i + 100] for i in range(0, len(payments) + 1, 100)]
+        queries = []
+
+        def fake_all(query: dict[str, Any]) -> dict[str, Any]:
+            queries.append(query)
+            items = pages[query["skip"] // 100]
+            return {"count": len(items), "items": items}
+
+        with mock.patch("server.utils.CLIENT.payment.all", side_effect=fake_all):
+            call_command("sync_razorpay_transactions", *args, stdout=StringIO())
+        return queries
+
+    def test_sync_razorpay_transactions(self) -> None:
+        created_at = now() - datetime.timedelta(hours=2)
+        payments = [
+            # A failed payment retried successfully, in either order
+            fake_payment("order_0", "failed", created_at),
+            fake_payment("order_0", "captured", created_at),
+            fake_payment("order_1", "captured", created_at),
+            fake_payment("order_1", "failed", created_at),
+            fake_payment("order_2", "failed", created_at),
+            # Completed transactions are not marked failed
+            fake_payment("order_3", "failed", created_at),
+        ] + [fake_payment("order_x", "created", created_at)] * 150
+
+        queries = self.sync(payments)
+        self.assertEqual(2, len(queries))
+        status = dict(RazorpayTransaction.objects.values_list("order_id", "status"))
+        self.assertEqual(
+            {
+                "order_0": "completed",
+                "order_1": "completed",
+                "order_2": "failed",
+                "order_3": "completed",
+            },
+            status,
+        )
+        self.assertTrue(Membership.objects.get(player=self.player).is_active)
+
+        # Only payments since the last synced payment are fetched next time
+        queries = self.sync([])
+        self.assertEqual(1, len(queries))
+        since = created_at - datetime.timedelta(hours=1)
+        self.assertEqual(int(since.timestamp()), queries[0]["from"])
+
+        queries = self.sync([], "--days=7")
+        since = now() - datetime.timedelta(days=7)
+        self.assertAlmostEqual(int(since.timestamp()), queries[0]["from"], delta=5)
+
 
 class TestInvalidateMemberships(TestCase):
     def test_invalidate_memberships(self) -> None:
@@ -1,3 +1,4 @@
+import io
 from pathlib import Path
 
 from server.manual_transactions import validate_manual_transactions
@@ -26,3 +27,38 @@ class TestManualTransactions(ApiBaseTestCase):
         self.assertEqual(1, stats["validated"])
         self.assertEqual(1, ManualTransaction.objects.filter(validated=False).count())
         self.assertFalse(ManualTransaction.objects.get(transaction_id="33680091811DC").validated)
+
+    def test_validate_manual_transactions_chunks(self) -> None:
+        # Transaction IDs are matched irrespective of the leading zeros
+        ManualTransaction.objects.create(
+            transaction_id="00033680400351DC", amount=232200, user=self.user
+        )
+        ManualTransaction.objects.create(
+            transaction_id="0033680400241DC", amount=131400, user=self.user
+        )
+        # One query to fetch, and one to update any matched transactions in each chunk
+        with self.assertNumQueries(7):
+            stats = validate_manual_transactions(self.fixture, chunk_size=1)
+        self.assertEqual(4, stats["total"])
+        self.assertEqual(4, stats["invalid_found"])
+        self.assertEqual(3, stats["validated"])
+        self.assertTrue(ManualTransaction.objects.get(transaction_id="00033680400351DC").validated)
+        self.assertTrue(ManualTransaction.objects.get(transaction_id="0033680400241DC").validated)
+
+    def test_validate_manual_transactions_duplicate_references(self) -> None:
+        # The first rows for the transaction have the wrong amount
+        statement = (
+            "Credit Amount,Chq/Ref Number\n"
+            "6.00,33680091811DC\n"
+            "1.00,326013145864\n"
+            "600.00,00033680091811DC\n"
+            "6.00,33680091811DC\n"
+        )
+        for chunk_size in (1, 10):
+            with self.subTest(chunk_size=chunk_size):
+                ManualTransaction.objects.update(validated=False)
+                stats = validate_manual_transactions(io.StringIO(statement), chunk_size=chunk_size)
+                self.assertEqual(2, stats["total"])
+                self.assertEqual(2, stats["invalid_found"])
+                self.assertEqual(2, stats["validated"])
+                self.assertFalse(ManualTransaction.objects.filter(validated=False).exists())
@@ -0,0 +1,104 @@
+from typing import Any
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.test import SimpleTestCase
+
+from server.top_score_utils import TokenBucket, TopScoreClient, parse_retry_after
+
+
+def fake_page_response(url: str, max_per_page: int = 100, **kwargs: Any) -> mock.MagicMock:
+    qs = parse_qs(urlparse(url).query)
+    page = int(qs["page"][0])
+    per_page = min(int(qs["per_page"][0]), max_per_page)
+    count = 23
+    start = (page - 1) * per_page
+    result = [{"id": i} for i in range(start, min(start + per_page, count))]
+    return mock.MagicMock(status_code=200, json=lambda: {"result": result, "count": count})
+
+
+class TestTopScoreClient(SimpleTestCase):
+    def test_paginated_request(self) -> None:
+        for max_workers in [1, 4]:
+            client = TopScoreClient(max_workers=max_workers)
+            with mock.patch.object(client.session, "get", side_effect=fake_page_response) as get:
+                results = client._paginated_request("https://upai.usetopscore.com/api/events", 5)
+            self.assertEqual(list(range(23)), [r["id"] for r in results or []])
+            self.assertEqual(5, get.call_count)
+
+    def test_paginated_request_page_size_cap(self) -> None:
+        for max_workers in [1, 4]:
+            client = TopScoreClient(max_workers=max_workers)
+
+            def capped_page_response(url: str, **kwargs: Any) -> mock.MagicMock:
+                return fake_page_response(url, max_per_page=4, **kwargs)
+
+            with mock.patch.object(client.session, "get", side_effect=capped_page_response) as get:
+                results = client._paginated_request("https://upai.usetopscore.com/api/events", 10)
+            self.assertEqual(list(range(23)), [r["id"] for r in results or []])
+            self.assertEqual(6, get.call_count)
+
+    def test_paginated_request_failure(self) -> None:
+        client = TopScoreClient()
+
+        def failing_page_response(url: str, **kwargs: Any) -> mock.MagicMock:
+            if "page=3" in url:
+                return mock.MagicMock(status_code=500)
+            return fake_page_response(url, **kwargs)
+
+        with mock.patch.object(
+            client.session, "get", side_effect=failing_page_response
+        ) as get, mock.patch("server.top_score_utils.time.sleep"):
+            results = client._paginated_request("https://upai.usetopscore.com/api/events", 5)
+        self.assertIsNone(results)
+        # The failing page is retried
+        self.assertEqual(4 + client.max_retries + 1, get.call_count)
+
+    def test_request_retries(self) -> None:
+        client = TopScoreClient()
+        url = "https://upai.usetopscore.com/api/events?page=1&per_page=5"
+        responses = [
+            mock.MagicMock(status_code=429, headers={"Retry-After": "3"}),
+            mock.MagicMock(status_code=503, headers={}),
+            fake_page_response(url),
+        ]
+        with mock.patch.object(client.session, "get", side_effect=responses), mock.patch(
+            "server.top_score_utils.time.sleep"
+        ) as sleep:
+            data = client._request(url)
+        self.assertEqual(fake_page_response(url).json(), data)
+        self.assertEqual(2, sleep.call_count)
+        self.assertEqual(mock.call(3), sleep.call_args_list[0])
+
+        # Client errors are not retried
+        with mock.patch.object(
+            client.session, "get", return_value=mock.MagicMock(status_code=404)
+        ) as get:
+            self.assertIsNone(client._request(url))
+        get.assert_called_once()
+
+    def test_request_refreshes_access_token(self) -> None:
+        client = TopScoreClient("username", "password")
+        url = "https://upai.usetopscore.com/api/me?page=1&per_page=5"
+        responses = [mock.MagicMock(status_code=401), fake_page_response(url)]
+        with mock.patch.object(client.session, "get", side_effect=responses), mock.patch.object(
+            client, "refresh_access_token"
+        ) as refresh_access_token:
+            data = client._request(url)
+        refresh_access_token.assert_called_once()
+        self.assertEqual(fake_page_response(url).json(), data)
+
+    def test_parse_retry_after(self) -> None:
+        self.assertEqual(120, parse_retry_after("120"))
+        self.assertEqual(0, parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_token_bucket(self) -> None:
+        bucket = TokenBucket(rate=10, capacity=2)
+        with mock.patch("server.top_score_utils.time.sleep") as sleep:
+            for _ in range(4):
+                bucket.acquire()
+        # The first two requests use up the burst capacity, others wait
+        self.assertEqual(2, sleep.call_count)
+        self.assertAlmostEqual(0.2, sleep.call_args_list[-1].args[0], places=1)
@@ -1,17 +1,64 @@
 import logging
+import math
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from json import JSONDecodeError
 from typing import Any
-from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+from urllib.parse import ParseResult, parse_qs, urlencode, urlparse, urlunparse
 
 import requests
+from requests.adapters import HTTPAdapter
 
 UPAI_BASE_URL = "https://upai.usetopscore.com/"
 HTTP_SUCCESS = 200
+HTTP_UNAUTHORIZED = 401
+HTTP_RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_BACKOFF = 60
 
 logger = logging.getLogger(__name__)
 
 
+class TokenBucket:
+    # NOTE: A client side rate limiter, shared by all the threads making
+    # requests using a client. Allows bursts of upto capacity requests.
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+            # Reserve a token, and wait until it is available
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
 class TopScoreClient:
     def __init__(
         self,
@@ -21,6 +68,10 @@ class TopScoreClient:
         client_secret: str | None = None,
         site_slug: str | None = None,
         per_page: int = 500,
+        max_workers: int = 4,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        requests_per_second: float = 10,
     ) -> None:
         self.username = username
         self.password = password
@@ -42,6 +93,19 @@ class TopScoreClient:
         self.headers = None  # type: dict[str, str] | None
         self.per_page = per_page
 
+        # NOTE: Pages of paginated requests are fetched concurrently using
+        # max_workers threads, sharing a pool of keep-alive connections.
+        self.max_workers = max(max_workers, 1)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+
+        # Failed requests are retried with exponential backoff (and jitter)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=self.max_workers)
+        self.token_lock = threading.Lock()
+
     def refresh_access_token(self) -> None:
         data = {
             "grant_type": "password",
@@ -52,7 +116,7 @@ class TopScoreClient:
         }
         logger.debug("Fetching user access token")
         try:
-            response = requests.post(f"{self.site_url}/api/oauth/server", data=data, timeout=15)
+            response = self.session.post(f"{self.site_url}/api/oauth/server", data=data, timeout=15)
         except requests.exceptions.RequestException as e:
             logger.error("Failed to get access token: %s", e)
             return None
@@ -114,14 +178,50 @@ class TopScoreClient:
         return registrations
 
     def _request(self, url: str) -> Any | None:
-        try:
-            response = requests.get(url, headers=self.headers, timeout=30)
-        except requests.exceptions.RequestException as e:
-            logger.error("Failed to get data: %s", e)
-            return None
+        refreshed_token = False
+        delay = 0.0
+        for attempt in range(self.max_retries + 1):
+            if delay > 0:
+                time.sleep(delay)
+                delay = 0
 
-        if response.status_code != HTTP_SUCCESS:
-            logger.error("Failed to get data: Server returned %s", response.status_code)
+            self.rate_limiter.acquire()
+            headers = self.headers
+            try:
+                response = self.session.get(url, headers=headers, timeout=30)
+            except requests.exceptions.RequestException as e:
+                logger.warning("Failed to get data (attempt %s): %s", attempt + 1, e)
+                delay = self._backoff_delay(attempt)
+                continue
+
+            status = response.status_code
+            if status == HTTP_SUCCESS:
+                break
+
+            elif status == HTTP_UNAUTHORIZED and self.username is not None and not refreshed_token:
+                # Refresh the access token once, unless another thread already did
+                with self.token_lock:
+                    if self.headers is headers:
+                        self.refresh_access_token()
+                refreshed_token = True
+
+            elif status in HTTP_RETRY_STATUSES:
+                logger.warning(
+                    "Failed to get data (attempt %s): Server returned %s", attempt + 1, status
+                )
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                delay = (
+                    min(retry_after, MAX_BACKOFF)
+                    if retry_after is not None
+                    else self._backoff_delay(attempt)
+                )
+
+            else:
+                logger.error("Failed to get data: Server returned %s", status)
+                return None
+
+        else:
+            logger.error("Failed to get data: Gave up after %s attempts", self.max_retries + 1)
             return None
 
         try:
@@ -132,6 +232,11 @@ class TopScoreClient:
 
         return data
 
+    def _backoff_delay(self, attempt: int) -> float:
+        # Exponential backoff with "full jitter"
+        delay = min(self.backoff * 2**attempt, MAX_BACKOFF)
+        return random.uniform(0, delay)  # noqa: S311
+
     def _paginated_request(self, url: str, page_size: int | None = None) -> Any | None:
         if page_size is None:
             page_size = self.per_page
@@ -140,23 +245,47 @@ class TopScoreClient:
         qs = parse_qs(parsed.query)
         qs["per_page"] = [str(page_size)]
 
-        page = 1
-        all_results = []
-        while True:
-            qs["page"] = [str(page)]
-            q = urlencode(qs, doseq=True)
-            url = urlunparse(
-                (parsed.scheme, parsed.netloc, parsed.path, parsed.params, q, parsed.fragment)
-            )
-            data = self._request(url)
+        data = self._request(self._page_url(parsed, qs, 1))
+        if data is None:
+            return data
+
+        all_results = data["result"]
+        count = data.get("count", len(all_results))
+        if not all_results or len(all_results) >= count:
+            return all_results
+
+        # The total count is known after the first page, and the remaining
+        # pages can be fetched concurrently. The server may return fewer
+        # results per page than requested, and the first page's size is used.
+        n_pages = math.ceil(count / len(all_results))
+        urls = [self._page_url(parsed, qs, page) for page in range(2, n_pages + 1)]
+
+        if self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+                pages = list(executor.map(self._request, urls))
+        else:
+            pages = [self._request(url) for url in urls]
+
+        for data in pages:
             if data is None:
                 return data
+            all_results.extend(data["result"])
 
-            results = data["result"]
-            all_results.extend(results)
-            n = len(all_results)
-            count = data.get("count", n)
-            if n < count:
-                page += 1
-            else:
-                return all_results
+        # Fetch any pages left, in case the pages got smaller in the meantime
+        page = n_pages
+        while len(all_results) < count:
+            page += 1
+            data = self._request(self._page_url(parsed, qs, page))
+            if data is None:
+                return data
+            if not data["result"]:
+                break
+            all_results.extend(data["result"])
+
+        return all_results
+
+    def _page_url(self, parsed: ParseResult, qs: dict[str, list[str]], page: int) -> str:
+        q = urlencode({**qs, "page": [str(page)]}, doseq=True)
+        return urlunparse(
+            (parsed.scheme, parsed.netloc, parsed.path, parsed.params, q, parsed.fragment)
+        )
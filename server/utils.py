@@ -1,5 +1,6 @@
 import datetime
 import uuid
+from collections.abc import Iterator
 from typing import Any
 
 import razorpay
@@ -11,6 +12,7 @@ CLIENT = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_S
 
 RAZORPAY_NOTES_MAX = 512
 RAZORPAY_DESCRIPTION_MAX = 255
+RAZORPAY_PAGE_SIZE = 100
 
 
 def create_razorpay_order(
@@ -39,29 +41,27 @@ def create_razorpay_order(
     return response
 
 
-def get_transactions() -> list[dict[str, Any]]:
-    today = now()
-    last_week = today - datetime.timedelta(days=7)
+def get_transactions(
+    since: datetime.datetime | None = None, until: datetime.datetime | None = None
+) -> Iterator[dict[str, Any]]:
+    until = until or now()
+    since = since or until - datetime.timedelta(days=7)
 
-    page_size = 100
     default = {
-        "from": int(last_week.timestamp()),
-        "to": int(today.timestamp()),
-        "count": page_size,
+        "from": int(since.timestamp()),
+        "to": int(until.timestamp()),
+        "count": RAZORPAY_PAGE_SIZE,
     }
 
-    transactions = []
     skip = 0
     while True:
         query = dict(**default, skip=skip)
-        transactions_ = CLIENT.payment.all(query)
-        if transactions_["count"] == 0:
+        transactions = CLIENT.payment.all(query)
+        yield from transactions["items"]
+        # NOTE: A page smaller than the page size is the last one
+        if transactions["count"] < RAZORPAY_PAGE_SIZE:
             break
-        else:
-            transactions.extend(transactions_["items"])
-        skip += page_size
-
-    return transactions
+        skip += RAZORPAY_PAGE_SIZE
 
 
 def verify_razorpay_payment(payment_info: dict[str, str]) -> bool: